@@ -0,0 +1,276 @@
+from datetime import date, timedelta
+
+import numpy as np
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+WEEKDAYS = ["Пн", "Вт", "Ср", "Чт", "Пт", "Сб", "Вс"]
+
+HEATMAP_MAX_WEEKS = 520
+
+# Тепловая карта: SQL отдаёт только корзины (неделя, день недели, час),
+# разворот в матрицу и все производные считаются в NumPy.
+# week_ago = 0 — последняя неделя периода (7 дней, заканчивающихся date_to).
+
+HEATMAP_ORDERS_SQL = text("""
+    SELECT
+      (CAST(:d2 AS date) - hour::date) / 7 AS week_ago,
+      EXTRACT(ISODOW FROM hour)::int - 1 AS dow,
+      EXTRACT(HOUR FROM hour)::int AS hour_of_day,
+      orders_count AS amount,
+      revenue
+    FROM orders_hourly
+    WHERE hour >= CAST(:d1 AS date) AND hour < CAST(:d2 AS date) + 1
+""")
+
+HEATMAP_DISH_SQL = text("""
+    SELECT
+      (CAST(:d2 AS date) - o.order_time::date) / 7 AS week_ago,
+      EXTRACT(ISODOW FROM o.order_time)::int - 1 AS dow,
+      EXTRACT(HOUR FROM o.order_time)::int AS hour_of_day,
+      SUM(oi.quantity) AS amount,
+      SUM(oi.quantity * COALESCE(oi.price, 0)) AS revenue
+    FROM order_items oi
+    JOIN orders o ON o.id = oi.order_id
+    WHERE oi.dish_id IN (SELECT id FROM dishes WHERE name ILIKE '%' || :dish_name || '%')
+      AND o.order_time >= CAST(:d1 AS date) AND o.order_time < CAST(:d2 AS date) + 1
+    GROUP BY 1, 2, 3
+""")
+
+HEATMAP_METRICS = {
+    "amount": "Количество",
+    "revenue": "Выручка",
+    "share": "Доля от итога, %",
+    "avg": "Среднее за неделю",
+    "rolling": "Скользящее среднее за последние недели",
+}
+
+HEATMAP_COLUMNS = [
+    ("weekday", "День недели"),
+    *[(f"h{h:02d}", f"{h:02d}") for h in range(24)],
+    ("total", "Итого"),
+]
+
+
+def heatmap_period(date_to: date, weeks: int):
+    # Период выравнивается по целым неделям, чтобы первая неделя не была неполной
+    return date_to - timedelta(days=7 * weeks - 1), date_to
+
+
+def heatmap(db: Session, date_to: date, weeks: int, window: int, dish_name: str = "") -> dict:
+    weeks = max(1, min(weeks, HEATMAP_MAX_WEEKS))
+    d1, d2 = heatmap_period(date_to, weeks)
+    params = {"d1": d1, "d2": d2}
+    if dish_name:
+        rows = db.execute(HEATMAP_DISH_SQL, {**params, "dish_name": dish_name}).all()
+    else:
+        rows = db.execute(HEATMAP_ORDERS_SQL, params).all()
+
+    amount = np.zeros((weeks, 7, 24))
+    revenue = np.zeros((weeks, 7, 24))
+    if rows:
+        week, dow, hour, amt, rev = (np.asarray(c) for c in zip(*rows))
+        idx = (week.astype(int), dow.astype(int), hour.astype(int))
+        # корзины уникальны (GROUP BY / PK свёртки), поэтому достаточно присваивания
+        amount[idx] = amt.astype(float)
+        revenue[idx] = rev.astype(float)
+
+    # неделя 0 — последняя; для временного ряда разворачиваем в хронологический порядок
+    series = amount[::-1]
+    total = series.sum(axis=0)
+    grand = total.sum()
+    window = max(1, min(window, weeks))
+
+    # скользящее среднее по неделям через накопленные суммы: (weeks - window + 1) × 7 × 24
+    csum = np.cumsum(series, axis=0)
+    csum = np.concatenate([np.zeros((1, 7, 24)), csum])
+    rolling = (csum[window:] - csum[:-window]) / window
+
+    return {
+        "date_from": d1,
+        "date_to": d2,
+        "weeks": weeks,
+        "window": window,
+        "amount": total,
+        "revenue": revenue.sum(axis=0),
+        "share": total / grand * 100 if grand else np.zeros((7, 24)),
+        "avg": total / weeks,
+        "rolling": rolling[-1],
+        "rolling_series": rolling,
+    }
+
+
+def heatmap_rows(result: dict, metric: str) -> list[dict]:
+    matrix = result[metric]
+    rows = []
+    for dow, values in enumerate(matrix):
+        if metric == "amount":
+            cells = np.rint(values).astype(int).tolist()
+            total = sum(cells)
+        else:
+            cells = np.round(values, 2).tolist()
+            total = round(float(values.sum()), 2)
+        row = {"weekday": WEEKDAYS[dow], "total": total}
+        row.update({f"h{h:02d}": v for h, v in enumerate(cells)})
+        rows.append(row)
+    return rows
+
+
+def heatmap_json(result: dict) -> dict:
+    payload = {
+        "date_from": result["date_from"].isoformat(),
+        "date_to": result["date_to"].isoformat(),
+        "weeks": result["weeks"],
+        "window": result["window"],
+        "weekdays": WEEKDAYS,
+        "hours": list(range(24)),
+    }
+    for metric in HEATMAP_METRICS:
+        payload[metric] = np.round(result[metric], 2).tolist()
+    payload["rolling_series"] = np.round(result["rolling_series"], 2).tolist()
+    return payload
+
+
+# Прогноз спроса на следующую неделю для закупок.
+# Матрица блюдо × день строится по dish_sales_daily (свёртка order_items,
+# sql/07_dish_sales_daily.sql). Модель на блюдо:
+#   уровень  — экспоненциальное сглаживание недельных продаж,
+#   профиль — доли дней недели в продажах за весь период истории.
+# Прогноз дня = уровень × доля этого дня недели. Расход продуктов —
+# прогноз × матрица рецептур (dish_products), как в consume_products.
+
+FORECAST_SALES_SQL = text("""
+    SELECT dish_id, day - CAST(:d1 AS date) AS day_index, quantity
+    FROM dish_sales_daily
+    WHERE day >= CAST(:d1 AS date) AND day < CAST(:d2 AS date)
+""")
+
+FORECAST_DISHES_SQL = text("SELECT id, name FROM dishes ORDER BY id")
+
+FORECAST_PRODUCTS_SQL = text("SELECT id, name, quantity FROM products ORDER BY id")
+
+FORECAST_RECIPES_SQL = text("SELECT dish_id, product_id, quantity FROM dish_products")
+
+FORECAST_MAX_WEEKS = 104
+
+FORECAST_PRODUCT_COLUMNS = [
+    ("product_name", "Продукт"),
+    ("needed", "Ожидаемый расход"),
+    ("stock", "Остаток"),
+    ("shortage", "Не хватает"),
+]
+
+
+def _positions(ids: np.ndarray, values) -> np.ndarray:
+    # ids отсортированы (ORDER BY id); -1 — значения, которых нет в справочнике
+    values = np.asarray(values, dtype=ids.dtype)
+    if not len(ids):
+        return np.full(len(values), -1)
+    pos = np.searchsorted(ids, values)
+    pos[pos >= len(ids)] = 0
+    return np.where(ids[pos] == values, pos, -1)
+
+
+def smoothing_weights(n: int, alpha: float) -> np.ndarray:
+    # L_t = α·x_t + (1 − α)·L_{t−1}, L_0 = x_0, развёрнутое в веса для x_0..x_{n−1}
+    weights = alpha * (1 - alpha) ** np.arange(n - 1, -1, -1, dtype=float)
+    weights[0] = (1 - alpha) ** (n - 1)
+    return weights
+
+
+def demand_forecast(db: Session, start: date, weeks: int, alpha: float) -> dict:
+    weeks = max(1, min(weeks, FORECAST_MAX_WEEKS))
+    alpha = min(max(alpha, 0.01), 1.0)
+    days = 7 * weeks
+    d1 = start - timedelta(days=days)
+
+    dishes = db.execute(FORECAST_DISHES_SQL).all()
+    products = db.execute(FORECAST_PRODUCTS_SQL).all()
+    sales = db.execute(FORECAST_SALES_SQL, {"d1": d1, "d2": start}).all()
+    recipes = db.execute(FORECAST_RECIPES_SQL).all()
+
+    dish_ids = np.array([r[0] for r in dishes], dtype=np.int64)
+    product_ids = np.array([r[0] for r in products], dtype=np.int64)
+
+    # история: блюдо × день; столбец k приходится на тот же день недели, что start + k
+    history = np.zeros((len(dishes), days))
+    if sales:
+        dish_col, day_col, qty_col = zip(*sales)
+        rows_ = _positions(dish_ids, dish_col)
+        keep = rows_ >= 0
+        history[rows_[keep], np.asarray(day_col)[keep]] = np.asarray(qty_col, dtype=float)[keep]
+
+    by_week = history.reshape(len(dishes), weeks, 7)
+    weekly = by_week.sum(axis=2)
+    level = weekly @ smoothing_weights(weeks, alpha)
+
+    weekday_totals = by_week.sum(axis=1)
+    totals = weekday_totals.sum(axis=1, keepdims=True)
+    profile = np.divide(weekday_totals, totals, out=np.full_like(weekday_totals, 1 / 7), where=totals > 0)
+    forecast = level[:, None] * profile
+
+    # матрица рецептур: блюдо × продукт
+    recipe = np.zeros((len(dishes), len(products)))
+    if recipes:
+        r_dish, r_product, r_qty = zip(*recipes)
+        rows_ = _positions(dish_ids, r_dish)
+        cols_ = _positions(product_ids, r_product)
+        keep = (rows_ >= 0) & (cols_ >= 0)
+        np.add.at(recipe, (rows_[keep], cols_[keep]), np.asarray(r_qty, dtype=float)[keep])
+    needed = forecast.sum(axis=1) @ recipe
+
+    stock = np.array([float(r[2] or 0) for r in products])
+    return {
+        "start": start,
+        "days": [start + timedelta(days=k) for k in range(7)],
+        "weeks": weeks,
+        "alpha": alpha,
+        "dish_names": [r[1] for r in dishes],
+        "last_week": weekly[:, -1],
+        "forecast": forecast,
+        "product_names": [r[1] for r in products],
+        "needed": needed,
+        "stock": stock,
+        "shortage": np.maximum(needed - stock, 0),
+    }
+
+
+def forecast_dish_columns(result: dict) -> list[tuple[str, str]]:
+    return [
+        ("dish_name", "Блюдо"),
+        *[(f"d{k}", f"{d:%d.%m} {WEEKDAYS[d.weekday()]}") for k, d in enumerate(result["days"])],
+        ("total", "Итого за неделю"),
+        ("last_week", "Продано за последнюю неделю"),
+    ]
+
+
+def forecast_dish_rows(result: dict) -> list[dict]:
+    forecast = np.round(result["forecast"], 1)
+    totals = np.round(result["forecast"].sum(axis=1), 1)
+    last_week = result["last_week"]
+    rows = []
+    # по убыванию прогноза; блюда без продаж и без прогноза не показываем
+    for i in np.argsort(-totals, kind="stable"):
+        if totals[i] == 0 and last_week[i] == 0:
+            continue
+        row = {"dish_name": result["dish_names"][i], "total": float(totals[i]), "last_week": float(last_week[i])}
+        row.update({f"d{k}": v for k, v in enumerate(forecast[i].tolist())})
+        rows.append(row)
+    return rows
+
+
+def forecast_product_rows(result: dict) -> list[dict]:
+    needed = np.round(result["needed"], 3)
+    shortage = np.round(result["shortage"], 3)
+    rows = []
+    # сначала то, чего не хватает, затем по объёму расхода
+    for i in np.lexsort((-needed, -shortage)):
+        if needed[i] == 0:
+            continue
+        rows.append({
+            "product_name": result["product_names"][i],
+            "needed": float(needed[i]),
+            "stock": round(float(result["stock"][i]), 3),
+            "shortage": float(shortage[i]),
+        })
+    return rows
@@ -0,0 +1,151 @@
+import json
+import logging
+import threading
+from bisect import bisect_left, bisect_right, insort
+from datetime import date, time, timedelta
+
+from sqlalchemy import text
+
+from .config import settings
+from .db import SessionLocal
+from .pg_listener import listener
+
+logger = logging.getLogger(__name__)
+
+# Загружаем брони начиная со вчерашнего дня: старые даты индекс не хранит,
+# такие запросы идут в free_tables() как раньше.
+LOAD_BOOKINGS_SQL = text("""
+    SELECT table_id, booking_date, start_time, end_time
+    FROM bookings
+    WHERE booking_date >= :since
+    ORDER BY table_id, booking_date, start_time
+""")
+
+LOAD_TABLE_DAY_SQL = text("""
+    SELECT start_time, end_time
+    FROM bookings
+    WHERE table_id = :table_id AND booking_date = :d
+    ORDER BY start_time
+""")
+
+LOAD_TABLES_SQL = text("SELECT id, table_number, seats, status FROM tables")
+
+
+class AvailabilityIndex:
+    # Свободные столы в памяти процесса.
+    # Для каждого (стол, дата) — отсортированные по началу интервалы броней.
+    # Брони одного стола не пересекаются (триггер "booking conflict"), поэтому
+    # концы интервалов тоже отсортированы и поиск пересечения — один bisect.
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._tables = {}
+        self._by_seats = []          # [(seats, table_id)] по возрастанию
+        self._starts = {}            # (table_id, date) -> [start_time]
+        self._ends = {}              # (table_id, date) -> [end_time]
+        self._since = None
+        self.loaded = False
+
+    def load(self):
+        since = date.today() - timedelta(days=1)
+        db = SessionLocal()
+        try:
+            tables_ = db.execute(LOAD_TABLES_SQL).mappings().all()
+            bookings = db.execute(LOAD_BOOKINGS_SQL, {"since": since}).all()
+        finally:
+            db.close()
+
+        starts, ends = {}, {}
+        for table_id, d, start, end in bookings:
+            starts.setdefault((table_id, d), []).append(start)
+            ends.setdefault((table_id, d), []).append(end)
+
+        with self._lock:
+            self._set_tables(tables_)
+            self._starts = starts
+            self._ends = ends
+            self._since = since
+            self.loaded = True
+
+    def reload_tables(self, payload: str = ""):
+        db = SessionLocal()
+        try:
+            tables_ = db.execute(LOAD_TABLES_SQL).mappings().all()
+        finally:
+            db.close()
+        with self._lock:
+            self._set_tables(tables_)
+
+    def reload_table_day(self, payload: str):
+        data = json.loads(payload)
+        table_id = data["table_id"]
+        d = date.fromisoformat(data["date"])
+
+        db = SessionLocal()
+        try:
+            rows = db.execute(LOAD_TABLE_DAY_SQL, {"table_id": table_id, "d": d}).all()
+        finally:
+            db.close()
+
+        with self._lock:
+            if self._since is None or d < self._since:
+                return
+            key = (table_id, d)
+            if rows:
+                self._starts[key] = [r[0] for r in rows]
+                self._ends[key] = [r[1] for r in rows]
+            else:
+                self._starts.pop(key, None)
+                self._ends.pop(key, None)
+
+    def _set_tables(self, rows):
+        self._tables = {r["id"]: dict(r) for r in rows}
+        self._by_seats = []
+        for r in rows:
+            insort(self._by_seats, (r["seats"] or 0, r["id"]))
+
+    def covers(self, d: date) -> bool:
+        return self.loaded and self._since is not None and d >= self._since
+
+    def _is_free(self, table_id: int, d: date, start: time, end: time) -> bool:
+        key = (table_id, d)
+        ends = self._ends.get(key)
+        if not ends:
+            return True
+        # первая бронь, которая заканчивается позже начала запроса
+        i = bisect_right(ends, start)
+        return i == len(ends) or self._starts[key][i] >= end
+
+    def free_tables(self, d: date, start: time, end: time, guests: int):
+        with self._lock:
+            first = bisect_left(self._by_seats, (guests, -1))
+            result = [
+                self._tables[table_id]
+                for _, table_id in self._by_seats[first:]
+                if self._is_free(table_id, d, start, end)
+            ]
+        result.sort(key=lambda r: (r["table_number"] is None, r["table_number"]))
+        return result
+
+    def lookup(self, d: date, start: time, end: time, guests: int):
+        # Список столов; None, если дату индекс не покрывает
+        if not self.covers(d):
+            return None
+        return self.free_tables(d, start, end, guests)
+
+
+availability = AvailabilityIndex()
+
+
+def start_availability():
+    if not settings.AVAILABILITY_INDEX_ENABLED:
+        return
+    try:
+        availability.load()
+    except Exception:
+        logger.exception("availability index load failed, falling back to free_tables()")
+        return
+    listener.subscribe("bookings_changed", availability.reload_table_day)
+    listener.subscribe("tables_changed", availability.reload_tables)
+    # перечитать после LISTEN: брони, записанные между load() и LISTEN, иначе потеряны
+    listener.on_reconnect(availability.load)
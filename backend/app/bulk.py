@@ -0,0 +1,74 @@
+from decimal import Decimal, InvalidOperation
+from functools import lru_cache
+
+from sqlalchemy import text
+
+from .entities import SQL_TYPES, parse_value
+
+# Массовые действия над справочником: удалить, задать значение поля,
+# изменить числовое поле на процент. Одно действие — один оператор
+# по выбранным id (= ANY(:ids)) или по всей категории.
+
+
+@lru_cache(maxsize=None)
+def bulk_sql(table: str, action: str, field: str, kind: str, scope: str):
+    where = "category = :category" if scope == "category" else "id = ANY(:ids)"
+    if action == "delete":
+        return text(f"DELETE FROM {table} WHERE {where}")
+    if action == "percent":
+        return text(f"UPDATE {table} SET {field} = ROUND({field} * (1 + :percent / 100.0), 2) WHERE {where}")
+    return text(f"UPDATE {table} SET {field} = CAST(:value AS {SQL_TYPES[kind]}) WHERE {where}")
+
+
+def bulk_params(entity, action: str, scope: str, ids: list[str], category: str, field: str, value: str, percent: str):
+    # Разбор формы: (аргументы bulk_sql, параметры запроса); ValueError с текстом для пользователя
+    fields = {f.name: f for f in entity.fields}
+    params = {}
+
+    if scope == "category":
+        if "category" not in fields:
+            raise ValueError("У справочника нет категорий.")
+        params["category"] = category.strip()
+        if not params["category"]:
+            raise ValueError("Не указана категория.")
+    else:
+        scope = "selected"
+        try:
+            params["ids"] = sorted({int(v) for v in ids})
+        except ValueError:
+            raise ValueError("Неверный идентификатор записи.")
+        if not params["ids"]:
+            raise ValueError("Не выбрано ни одной записи.")
+
+    if action == "delete":
+        return (entity.table, "delete", "", "", scope), params
+
+    spec_field = fields.get(field)
+    if spec_field is None:
+        raise ValueError("Не выбрано поле.")
+    name, label, kind, required, _ = spec_field
+
+    if action == "percent":
+        if kind not in ("integer", "numeric"):
+            raise ValueError(f"Поле «{label}» не числовое.")
+        try:
+            params["percent"] = Decimal(percent.strip().replace(",", "."))
+        except InvalidOperation:
+            raise ValueError("Неверное значение процента.")
+        # NaN и Infinity разбираются без ошибки, но сравнивать их нельзя
+        if not params["percent"].is_finite():
+            raise ValueError("Неверное значение процента.")
+        if params["percent"] <= -100:
+            raise ValueError("Процент должен быть больше −100.")
+        return (entity.table, "percent", name, kind, scope), params
+
+    if action == "set":
+        try:
+            params["value"] = parse_value(kind, value)
+        except ValueError:
+            raise ValueError(f"Неверное значение поля «{label}».")
+        if required and params["value"] is None:
+            raise ValueError(f"Поле «{label}» обязательно.")
+        return (entity.table, "set", name, kind, scope), params
+
+    raise ValueError("Неизвестное действие.")
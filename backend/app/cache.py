@@ -0,0 +1,133 @@
+import logging
+import threading
+import time
+from datetime import datetime
+
+from sqlalchemy import text
+
+from .config import settings
+from .db import engine
+from .pg_listener import listener
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "report_cache"
+
+
+def normalize_params(params: dict) -> tuple:
+    # Ключ — ровно те параметры, что уходят в запрос: вызывающий код
+    # нормализует их сам (strip), иначе разные выборки делили бы одну запись
+    return tuple(sorted(params.items()))
+
+
+class ReportCache:
+    # Кэш результатов отчётов в памяти процесса.
+    # Каждая запись помечена таблицами, от которых зависит; запись в таблицу
+    # вытесняет зависимые записи в этом воркере и через NOTIFY report_cache —
+    # в остальных (start_report_cache). TTL — страховка, если уведомление потеряно.
+    # Поколение тега растёт при каждом вытеснении: результат, загруженный
+    # во время вытеснения, в кэш не попадает.
+
+    def __init__(self, ttl: int):
+        self.ttl = ttl
+        self._entries = {}
+        self._by_tag = {}
+        self._generations = {}
+        self._epoch = 0
+        self._lock = threading.Lock()
+
+    def get(self, name: str, params: dict):
+        key = (name, normalize_params(params))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if time.monotonic() - entry["stored"] > self.ttl:
+                self._drop(key)
+                return None
+            return entry
+
+    def generation(self, tags):
+        with self._lock:
+            return self._epoch, tuple(self._generations.get(tag, 0) for tag in tags)
+
+    def put(self, name: str, params: dict, rows, tags, generation=None):
+        # generation — снимок generation(tags) до загрузки; если с тех пор
+        # теги вытеснялись, результат мог устареть и не сохраняется
+        key = (name, normalize_params(params))
+        entry = {
+            "rows": [dict(r) for r in rows],
+            "tags": tuple(tags),
+            "stored": time.monotonic(),
+            "created_at": datetime.now(),
+        }
+        with self._lock:
+            current = (self._epoch, tuple(self._generations.get(tag, 0) for tag in entry["tags"]))
+            if generation is not None and generation != current:
+                return entry
+            self._drop(key)
+            self._entries[key] = entry
+            for tag in entry["tags"]:
+                self._by_tag.setdefault(tag, set()).add(key)
+        return entry
+
+    def invalidate(self, *tables: str):
+        self.invalidate_local(*tables)
+        if self.ttl > 0 and tables:
+            self._notify(tables)
+
+    def invalidate_local(self, *tables: str):
+        with self._lock:
+            for table in tables:
+                self._generations[table] = self._generations.get(table, 0) + 1
+                for key in self._by_tag.pop(table, set()):
+                    self._drop(key)
+
+    def clear(self):
+        with self._lock:
+            self._epoch += 1
+            self._entries.clear()
+            self._by_tag.clear()
+
+    def on_notify(self, payload: str):
+        self.invalidate_local(*payload.split(","))
+
+    def _notify(self, tables):
+        # Отдельное соединение: вызывается уже после commit записи
+        try:
+            with engine.connect() as conn:
+                conn.execute(text("SELECT pg_notify(:channel, :tags)"), {"channel": CHANNEL, "tags": ",".join(tables)})
+                conn.commit()
+        except Exception:
+            logger.exception("report cache notify failed for %s", tables)
+
+    def _drop(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for tag in entry["tags"]:
+            keys = self._by_tag.get(tag)
+            if keys is not None:
+                keys.discard(key)
+
+    def rows(self, name: str, params: dict, tags, load):
+        # Возвращает (rows, created_at или None, если результат свежий)
+        if self.ttl <= 0:
+            return load(), None
+        entry = self.get(name, params)
+        if entry is not None:
+            return entry["rows"], entry["created_at"]
+        generation = self.generation(tags)
+        entry = self.put(name, params, load(), tags, generation)
+        return entry["rows"], None
+
+
+report_cache = ReportCache(settings.REPORT_CACHE_TTL_SEC)
+
+
+def start_report_cache():
+    # Вытеснения из других воркеров; за время разрыва LISTEN они потеряны — сбрасываем всё
+    if report_cache.ttl <= 0:
+        return
+    listener.subscribe(CHANNEL, report_cache.on_notify)
+    listener.on_reconnect(report_cache.clear)
@@ -7,5 +7,38 @@ class Settings(BaseSettings):
     DATABASE_URL: str
     SECRET_KEY: str
 
+    # Живой поиск: ограничение времени одного запроса (мс)
+    SEARCH_STATEMENT_TIMEOUT_MS: int = 3000
+
+    # Период обновления витрин отчётов (сек); 0 — только вручную
+    REPORT_REFRESH_INTERVAL_SEC: int = 300
+
+    # Время жизни записей кэша отчётов (сек); 0 — кэш выключен.
+    # Вытеснение между воркерами идёт через NOTIFY, TTL — на случай потери уведомления
+    REPORT_CACHE_TTL_SEC: int = 300
+
+    # Размер пачки строк при потоковой выгрузке CSV/XLSX
+    EXPORT_BATCH_SIZE: int = 2000
+
+    # Фоновые задачи отчётов: размер пула, срок хранения результата,
+    # как часто воркер отмечает свои задачи живыми и через сколько секунд
+    # без отметки "выполняемая" задача считается прерванной
+    JOB_WORKERS: int = 2
+    JOB_RESULT_TTL_HOURS: int = 24
+    JOB_HEARTBEAT_SEC: int = 30
+    JOB_STALE_SEC: int = 180
+
+    # Индекс свободных столов в памяти (иначе — free_tables() в БД)
+    AVAILABILITY_INDEX_ENABLED: bool = True
+
+    # Панель отчётов: какие отчёты показывать и сколько ждать каждый (мс)
+    DASHBOARD_REPORTS: list[str] = ["revenue", "dishes_sales", "guest_statistics", "free_tables", "stock_alerts"]
+    DASHBOARD_TIMEOUT_MS: int = 5000
+
+    # Монитор склада: на сколько дней вперёд отслеживаются сроки годности
+    # и как часто (сек) сдвигается граница проверки; 0 — не проверять
+    STOCK_EXPIRY_HORIZON_DAYS: int = 30
+    STOCK_CHECK_INTERVAL_SEC: int = 3600
+
 
 settings = Settings()
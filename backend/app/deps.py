@@ -20,5 +20,10 @@ def require_admin(request: Request):
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="auth_required",
         )
+    if user.get("role") != "admin":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="admin_required",
+        )
     return user
 
@@ -0,0 +1,152 @@
+from datetime import date
+from decimal import Decimal, InvalidOperation
+from typing import NamedTuple
+
+from sqlalchemy import text
+
+from .importer import build_import_statements
+
+# Реестр справочников: по описанию таблицы строятся маршруты
+# (app/routers/dictionaries.py), а все запросы — один раз, при импорте модуля.
+
+
+class Field(NamedTuple):
+    name: str
+    label: str
+    kind: str = "text"             # text | integer | numeric | date
+    required: bool = False
+    default: str | None = None     # SQL-выражение для пустого значения
+
+
+# Вид поля -> тип SQL для CAST параметра (также в app/bulk.py)
+SQL_TYPES = {"text": "text", "integer": "integer", "numeric": "numeric", "date": "date"}
+
+
+def parse_value(kind: str, value: str):
+    # Значение из формы -> значение параметра; ValueError при неверном формате
+    value = value.strip()
+    if value == "":
+        return None
+    if kind == "integer":
+        return int(value)
+    if kind == "numeric":
+        try:
+            return Decimal(value.replace(",", "."))
+        except InvalidOperation:
+            raise ValueError(value)
+    if kind == "date":
+        return date.fromisoformat(value)
+    return value
+
+
+def _bind(field: Field) -> str:
+    expr = f"CAST(:{field.name} AS {SQL_TYPES[field.kind]})"
+    return f"COALESCE({expr}, {field.default})" if field.default else expr
+
+
+class Entity:
+    def __init__(self, slug, table, title, noun, form_template, fields, key=None, default_sort="id"):
+        self.slug = slug                    # часть пути: /справочники/<slug>
+        self.table = table
+        self.title = title                  # «Блюда»
+        self.noun = noun                    # «блюдо»: «Добавить блюдо»
+        self.form_template = form_template
+        self.fields = fields
+        self.key = key                      # поле сопоставления при загрузке CSV
+        self.default_sort = default_sort
+        self.url = f"/справочники/{slug}"
+        self.columns = [("id", "Идентификатор")] + [(f.name, f.label) for f in fields]
+        self.has_category = any(f.name == "category" for f in fields)
+
+        names = [f.name for f in fields]
+        select = ", ".join(key for key, _ in self.columns)
+        self.get_sql = text(f"SELECT {select} FROM {table} WHERE id = :id")
+        self.insert_sql = text(
+            f"INSERT INTO {table} ({', '.join(names)}) VALUES ({', '.join(_bind(f) for f in fields)})"
+        )
+        self.update_sql = text(
+            f"UPDATE {table} SET {', '.join(f'{f.name} = {_bind(f)}' for f in fields)} WHERE id = :id"
+        )
+        self.delete_sql = text(f"DELETE FROM {table} WHERE id = :id")
+        for name, statement in build_import_statements(self).items():
+            setattr(self, name, statement)
+
+    def parse_form(self, form) -> dict:
+        # Поля формы -> параметры запроса; ValueError с текстом для пользователя
+        values = {}
+        for f in self.fields:
+            try:
+                values[f.name] = parse_value(f.kind, form.get(f.name) or "")
+            except ValueError:
+                raise ValueError(f"Неверное значение поля «{f.label}».")
+            if f.required and values[f.name] is None:
+                raise ValueError(f"Поле «{f.label}» обязательно.")
+        return values
+
+
+ENTITIES = {
+    e.slug: e
+    for e in (
+        Entity(
+            "блюда", "dishes", "Блюда", "блюдо", "admin/edit.html",
+            [
+                Field("name", "Наименование", required=True),
+                Field("category", "Категория"),
+                Field("price", "Цена", "numeric", required=True),
+                Field("country_of_origin", "Страна происхождения"),
+            ],
+            key="name",
+        ),
+        Entity(
+            "гости", "guests", "Гости", "гостя", "admin/edit_guest.html",
+            [
+                Field("last_name", "Фамилия", required=True),
+                Field("first_name", "Имя", required=True),
+                Field("middle_name", "Отчество"),
+                Field("birth_date", "Дата рождения", "date"),
+            ],
+        ),
+        Entity(
+            "столы", "tables", "Столы", "стол", "admin/edit_table.html",
+            [
+                Field("table_number", "Номер стола", "integer", required=True),
+                Field("seats", "Мест", "integer", required=True),
+                Field("status", "Статус", default="'free'"),
+            ],
+            key="table_number",
+            default_sort="table_number",
+        ),
+        Entity(
+            "официанты", "waiters", "Официанты", "официанта", "admin/edit_waiter.html",
+            [
+                Field("last_name", "Фамилия", required=True),
+                Field("first_name", "Имя", required=True),
+                Field("middle_name", "Отчество"),
+                Field("salary", "Оклад", "numeric"),
+            ],
+        ),
+        Entity(
+            "поставщики", "suppliers", "Поставщики", "поставщика", "admin/edit_supplier.html",
+            [
+                Field("name", "Название", required=True),
+                Field("address", "Адрес"),
+                Field("contact_person", "Контактное лицо"),
+                Field("phone", "Телефон"),
+                Field("email", "Электронная почта"),
+            ],
+            key="name",
+        ),
+        Entity(
+            "продукты", "products", "Продукты", "продукт", "admin/edit_product.html",
+            [
+                Field("name", "Наименование", required=True),
+                Field("weight", "Масса единицы", "numeric"),
+                Field("expiry_date", "Срок годности", "date"),
+                Field("quantity", "Количество", "numeric"),
+                Field("reorder_level", "Порог дозаказа", "numeric"),
+                Field("category", "Категория"),
+            ],
+            key="name",
+        ),
+    )
+}
@@ -0,0 +1,110 @@
+import csv
+import io
+import tempfile
+from urllib.parse import quote
+
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+
+from .config import settings
+from .db import engine
+
+try:
+    from openpyxl import Workbook
+except ImportError:  # XLSX — необязательная зависимость
+    Workbook = None
+
+EXPORT_FORMATS = ("csv", "xlsx")
+
+CSV_MEDIA_TYPE = "text/csv; charset=utf-8"
+XLSX_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+# Небольшие книги собираются в памяти, большие — на диске
+XLSX_SPOOL_BYTES = 1024 * 1024
+
+
+def _stream_rows(sql, params: dict):
+    # Серверный курсор: строки читаются пачками по EXPORT_BATCH_SIZE,
+    # в памяти воркера никогда не лежит весь результат.
+    # Своё соединение, т.к. сессия запроса закрывается до конца ответа.
+    with engine.connect() as conn:
+        result = conn.execution_options(
+            stream_results=True,
+            yield_per=settings.EXPORT_BATCH_SIZE,
+        ).execute(sql, params)
+        for partition in result.mappings().partitions():
+            yield partition
+
+
+def _csv_chunks(sql, params: dict, columns):
+    buf = io.StringIO()
+    writer = csv.writer(buf, delimiter=";")
+
+    # BOM, чтобы Excel открыл UTF-8 без вопросов
+    buf.write("\ufeff")
+    writer.writerow([label for _, label in columns])
+    for partition in _stream_rows(sql, params):
+        for row in partition:
+            writer.writerow(["" if row[key] is None else row[key] for key, _ in columns])
+        yield buf.getvalue().encode("utf-8")
+        buf.seek(0)
+        buf.truncate()
+    yield buf.getvalue().encode("utf-8")
+
+
+def _xlsx_chunks(sql, params: dict, columns):
+    # Потоково отдаётся только CSV. XLSX — zip-архив, его можно отдать лишь
+    # после сохранения книги: write_only-книга пишет строки во временный файл,
+    # память не растёт с числом строк, но первый байт уходит только после
+    # выборки всех строк. Для больших выгрузок нужен CSV.
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet()
+    ws.append([label for _, label in columns])
+    for partition in _stream_rows(sql, params):
+        for row in partition:
+            ws.append([row[key] for key, _ in columns])
+
+    with tempfile.SpooledTemporaryFile(max_size=XLSX_SPOOL_BYTES) as tmp:
+        wb.save(tmp)
+        tmp.seek(0)
+        while chunk := tmp.read(64 * 1024):
+            yield chunk
+
+
+def export_response(sql, params: dict, columns, filename: str, fmt: str):
+    fmt = (fmt or "").strip().lower()
+    if fmt not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail="Неизвестный формат выгрузки.")
+    if fmt == "xlsx" and Workbook is None:
+        raise HTTPException(status_code=501, detail="Выгрузка в XLSX недоступна: не установлен openpyxl.")
+
+    if fmt == "csv":
+        body, media_type = _csv_chunks(sql, params, columns), CSV_MEDIA_TYPE
+    else:
+        body, media_type = _xlsx_chunks(sql, params, columns), XLSX_MEDIA_TYPE
+
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers={
+            "Content-Disposition": f"attachment; filename*=UTF-8''{quote(filename)}.{fmt}",
+        },
+    )
+
+
+def rows_csv_response(rows, columns, filename: str):
+    # Выгрузка уже сохранённых строк (например, результата фоновой задачи)
+    buf = io.StringIO()
+    writer = csv.writer(buf, delimiter=";")
+    buf.write("\ufeff")
+    writer.writerow([label for _, label in columns])
+    for row in rows:
+        writer.writerow(["" if row.get(key) is None else row.get(key) for key, _ in columns])
+
+    return StreamingResponse(
+        iter([buf.getvalue().encode("utf-8")]),
+        media_type=CSV_MEDIA_TYPE,
+        headers={
+            "Content-Disposition": f"attachment; filename*=UTF-8''{quote(filename)}.csv",
+        },
+    )
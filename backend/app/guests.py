@@ -0,0 +1,48 @@
+from datetime import date
+
+from fastapi import HTTPException
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+# Гость ищется по нормализованному ФИО и дате рождения (sql/13_guest_dedup.sql,
+# sql/20_guest_dedup_linked.sql): повторный заказ того же человека не создаёт
+# новую запись в guests. Без даты рождения гость всегда новый; гость,
+# привязанный к аккаунту, для заказов не подбирается и не объединяется.
+
+FIND_OR_CREATE_GUEST_SQL = text(
+    "SELECT find_or_create_guest(:last_name, :first_name, :middle_name, CAST(:birth_date AS date))"
+)
+
+MERGE_GUESTS_SQL = text("SELECT merged_guests, moved_orders FROM merge_duplicate_guests()")
+
+MERGE_GUESTS_COLUMNS = [
+    ("merged_guests", "Удалено дубликатов"),
+    ("moved_orders", "Перенесено заказов"),
+]
+
+
+def parse_birth_date(value: str) -> date | None:
+    value = (value or "").strip()
+    if not value:
+        return None
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Неверная дата рождения.")
+
+
+def find_or_create_guest(db: Session, last_name: str, first_name: str, middle_name: str = "", birth_date: date | None = None) -> int:
+    # Коммит — на вызывающей стороне, вместе с заказом
+    return db.execute(
+        FIND_OR_CREATE_GUEST_SQL,
+        {
+            "last_name": last_name.strip(),
+            "first_name": first_name.strip(),
+            "middle_name": middle_name.strip(),
+            "birth_date": birth_date,
+        },
+    ).scalar_one()
+
+
+def merge_duplicate_guests(db: Session):
+    return db.execute(MERGE_GUESTS_SQL).mappings().all()
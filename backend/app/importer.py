@@ -0,0 +1,174 @@
+import codecs
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+# Загрузка справочников из CSV.
+# Файл целиком уходит в COPY ... FROM STDIN во временную таблицу (все колонки text),
+# проверки выполняются запросами по всей таблице сразу, затем UPDATE
+# существующих и одно INSERT новых строк — в той же транзакции.
+# Строки с id обновляют запись с этим id; строки без id обновляют запись
+# с тем же ключом справочника (key), а если её нет — добавляются.
+# Заголовок — имена колонок или подписи из выгрузки CSV (round-trip).
+# Описание полей — в реестре справочников (app/entities.py).
+
+MAX_REPORTED_ERRORS = 200
+
+# тип -> (проверка значения, приведение); {v} — выражение значения из staging
+_TYPES = {
+    "text": (None, "{v}"),
+    "integer": ("{v} ~ '^[-+]?[0-9]{{1,9}}$'", "CAST({v} AS integer)"),
+    "numeric": ("{v} ~ '^[-+]?[0-9]+([.,][0-9]+)?$'", "CAST(replace({v}, ',', '.') AS numeric)"),
+    "date": ("import_valid_date({v})", "CAST({v} AS date)"),
+}
+
+
+def _value(name: str) -> str:
+    return f"NULLIF(btrim(s.{name}), '')"
+
+
+def _cast(field) -> str:
+    name, _, kind, _, default = field
+    expr = _TYPES[kind][1].format(v=_value(name))
+    return f"COALESCE({expr}, {default})" if default else expr
+
+
+def build_import_statements(entity) -> dict:
+    # Запросы загрузки справочника; собираются один раз, при создании Entity.
+    # Условия сопоставления — простые равенства, чтобы UPDATE/INSERT шли hash join'ами.
+    table, fields, key = entity.table, entity.fields, entity.key
+    names = [f[0] for f in fields]
+    id_value = _value("id")
+    id_valid = _TYPES["integer"][0].format(v=id_value)
+
+    checks = [
+        f"SELECT line, 'Неверный идентификатор' AS message FROM import_stage s "
+        f"WHERE {id_value} IS NOT NULL AND NOT {id_valid}",
+        f"SELECT line, 'Идентификатор повторяется в файле' FROM ("
+        f"SELECT line, COUNT(*) OVER (PARTITION BY {id_value}) AS n FROM import_stage s "
+        f"WHERE {id_value} IS NOT NULL) d WHERE n > 1",
+        f"SELECT s.line, 'Запись с таким идентификатором не найдена' FROM import_stage s "
+        f"LEFT JOIN {table} t ON t.id = CASE WHEN {id_valid} THEN CAST({id_value} AS integer) END "
+        f"WHERE {id_value} IS NOT NULL AND {id_valid} AND t.id IS NULL",
+    ]
+    for name, label, kind, required, _ in fields:
+        if required:
+            checks.append(f"SELECT line, 'Не заполнено поле «{label}»' FROM import_stage s WHERE {_value(name)} IS NULL")
+        valid = _TYPES[kind][0]
+        if valid:
+            checks.append(
+                f"SELECT line, 'Неверное значение поля «{label}»' FROM import_stage s "
+                f"WHERE {_value(name)} IS NOT NULL AND NOT {valid.format(v=_value(name))}"
+            )
+    if key:
+        key_label = next(f[1] for f in fields if f[0] == key)
+        checks.append(
+            f"SELECT line, 'Повтор в файле: «{key_label}»' FROM ("
+            f"SELECT line, COUNT(*) OVER (PARTITION BY lower({_value(key)})) AS n FROM import_stage s "
+            f"WHERE {id_value} IS NULL AND {_value(key)} IS NOT NULL) d WHERE n > 1"
+        )
+
+    errors_sql = text(
+        "SELECT line, message, COUNT(*) OVER () AS total FROM ("
+        + " UNION ALL ".join(checks)
+        + ") e ORDER BY line, message LIMIT :max_errors"
+    )
+
+    assignments = ", ".join(f"{f[0]} = {_cast(f)}" for f in fields)
+    statements = [
+        text(
+            f"UPDATE {table} t SET {assignments} FROM import_stage s "
+            f"WHERE {id_value} IS NOT NULL AND t.id = CAST({id_value} AS integer)"
+        )
+    ]
+    if key:
+        kind = next(f[2] for f in fields if f[0] == key)
+        key_value = _TYPES[kind][1].format(v=_value(key))
+        key_match = f"lower(t.{key}) = lower({key_value})" if kind == "text" else f"t.{key} = {key_value}"
+        statements.append(text(
+            f"UPDATE {table} t SET {assignments} FROM import_stage s "
+            f"WHERE {id_value} IS NULL AND {key_match}"
+        ))
+        new_rows = f"{id_value} IS NULL AND NOT EXISTS (SELECT 1 FROM {table} t WHERE {key_match})"
+    else:
+        new_rows = f"{id_value} IS NULL"
+
+    insert_sql = text(
+        f"INSERT INTO {table} ({', '.join(names)}) "
+        f"SELECT {', '.join(_cast(f) for f in fields)} FROM import_stage s "
+        f"WHERE {new_rows} ORDER BY s.line"
+    )
+    return {
+        "import_errors_sql": errors_sql,
+        "import_update_statements": statements,
+        "import_insert_sql": insert_sql,
+    }
+
+
+def _read_header(raw) -> tuple[list[str], str]:
+    # Первая строка файла: снимаем BOM, определяем разделитель (; из нашей выгрузки или ,)
+    first = raw.readline()
+    raw.seek(0)
+    if first.startswith(codecs.BOM_UTF8):
+        raw.seek(len(codecs.BOM_UTF8))
+        first = first[len(codecs.BOM_UTF8):]
+    line = first.decode("utf-8").strip()
+    delimiter = ";" if line.count(";") >= line.count(",") else ","
+    return [h.strip().strip('"') for h in line.split(delimiter)], delimiter
+
+
+def staging_columns(entity, header: list[str]) -> tuple[list[str], str | None]:
+    # Заголовок файла -> колонки staging; незнакомые колонки пропускаются (x_N)
+    lookup = {"id": "id", "идентификатор": "id"}
+    for name, label, *_ in entity.fields:
+        lookup[name.lower()] = name
+        lookup[label.lower()] = name
+
+    columns, seen = [], set()
+    for i, title in enumerate(header):
+        name = lookup.get(title.lower(), f"x_{i}")
+        if name in seen:
+            return [], f"Колонка «{title}» встречается в файле дважды."
+        seen.add(name)
+        columns.append(name)
+
+    missing = [label for name, label, _, required, _ in entity.fields if required and name not in seen]
+    if missing:
+        return [], "В файле нет обязательных колонок: " + ", ".join(f"«{m}»" for m in missing) + "."
+    return columns, None
+
+
+def import_csv(db: Session, entity, raw) -> dict:
+    # raw — бинарный файл (UploadFile.file). Возвращает {errors, total_errors, updated, inserted}
+    # или {message} при ошибке формата. Коммит — на вызывающей стороне.
+    header, delimiter = _read_header(raw)
+    columns, problem = staging_columns(entity, header)
+    if problem:
+        return {"message": problem}
+
+    stage_columns = set(columns) | {"id"} | {f[0] for f in entity.fields}
+    db.execute(text(
+        "CREATE TEMP TABLE import_stage (line bigserial, "
+        + ", ".join(f"{c} text" for c in sorted(stage_columns))
+        + ") ON COMMIT DROP"
+    ))
+    # номер строки файла: заголовок — строка 1
+    db.execute(text("SELECT setval(pg_get_serial_sequence('import_stage', 'line'), 2, false)"))
+
+    cursor = db.connection().connection.cursor()
+    try:
+        cursor.copy_expert(
+            f"COPY import_stage ({', '.join(columns)}) FROM STDIN "
+            f"WITH (FORMAT csv, HEADER true, DELIMITER '{delimiter}', ENCODING 'UTF8')",
+            raw,
+        )
+    finally:
+        cursor.close()
+
+    errors = db.execute(entity.import_errors_sql, {"max_errors": MAX_REPORTED_ERRORS}).mappings().all()
+    if errors:
+        return {"errors": errors, "total_errors": errors[0]["total"], "updated": 0, "inserted": 0}
+
+    updated = sum(db.execute(sql).rowcount for sql in entity.import_update_statements)
+    inserted = db.execute(entity.import_insert_sql).rowcount
+    return {"errors": [], "total_errors": 0, "updated": updated, "inserted": inserted}
@@ -0,0 +1,239 @@
+import json
+import logging
+import os
+import socket
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from .config import settings
+from .db import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+# Виды задач: kind -> {"title", "columns", "run"}.
+# run(db, params) возвращает строки результата.
+JOB_KINDS = {}
+
+JOB_STATUS_TITLES = {
+    "queued": "В очереди",
+    "running": "Выполняется",
+    "done": "Готово",
+    "failed": "Ошибка",
+}
+
+# Процесс, выполняющий задачу (report_jobs.worker, sql/17_report_jobs_heartbeat.sql)
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+_executor = None
+
+
+def register_job(kind: str, title: str, columns, run):
+    JOB_KINDS[kind] = {"title": title, "columns": columns, "run": run}
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=settings.JOB_WORKERS, thread_name_prefix="report-job")
+    return _executor
+
+
+def submit_job(db: Session, kind: str, params: dict, user_id=None) -> int:
+    if kind not in JOB_KINDS:
+        raise ValueError(f"unknown job kind: {kind}")
+
+    # заодно чистим просроченные результаты
+    db.execute(text("DELETE FROM report_jobs WHERE expires_at < now()"))
+    job_id = db.execute(
+        text("""
+            INSERT INTO report_jobs (kind, params, created_by)
+            VALUES (:kind, CAST(:params AS jsonb), :uid)
+            RETURNING id
+        """),
+        {"kind": kind, "params": json.dumps(params), "uid": user_id},
+    ).scalar_one()
+    db.commit()
+
+    _get_executor().submit(_run_job, job_id)
+    return job_id
+
+
+def get_job(db: Session, job_id: int):
+    return db.execute(
+        text("""
+            SELECT id, kind, params, status, rows, error, created_by,
+                   created_at, started_at, finished_at, expires_at
+            FROM report_jobs
+            WHERE id = :id
+        """),
+        {"id": job_id},
+    ).mappings().first()
+
+
+def _run_job(job_id: int):
+    db = SessionLocal()
+    try:
+        # Забираем задачу; если её уже взял другой воркер — выходим
+        job = db.execute(
+            text("""
+                UPDATE report_jobs
+                SET status = 'running', started_at = now(), worker = :worker, heartbeat_at = now()
+                WHERE id = :id AND status = 'queued'
+                RETURNING kind, params
+            """),
+            {"id": job_id, "worker": WORKER_ID},
+        ).mappings().first()
+        db.commit()
+        if job is None:
+            return
+
+        kind = JOB_KINDS.get(job["kind"])
+        if kind is None:
+            raise ValueError(f"unknown job kind: {job['kind']}")
+
+        rows = kind["run"](db, job["params"] or {})
+        db.commit()
+
+        db.execute(
+            text("""
+                UPDATE report_jobs
+                SET status = 'done',
+                    rows = CAST(:rows AS jsonb),
+                    finished_at = now(),
+                    expires_at = now() + make_interval(hours => :ttl)
+                WHERE id = :id
+            """),
+            {
+                "id": job_id,
+                "rows": json.dumps([dict(r) for r in rows], default=str, ensure_ascii=False),
+                "ttl": settings.JOB_RESULT_TTL_HOURS,
+            },
+        )
+        db.commit()
+    except Exception as exc:
+        db.rollback()
+        logger.exception("report job %s failed", job_id)
+        db.execute(
+            text("""
+                UPDATE report_jobs
+                SET status = 'failed',
+                    error = :error,
+                    finished_at = now(),
+                    expires_at = now() + make_interval(hours => :ttl)
+                WHERE id = :id
+            """),
+            {"id": job_id, "error": str(getattr(exc, "orig", None) or exc), "ttl": settings.JOB_RESULT_TTL_HOURS},
+        )
+        db.commit()
+    finally:
+        db.close()
+
+
+FAIL_STALE_SQL = text("""
+    UPDATE report_jobs
+    SET status = 'failed', error = :error, finished_at = now(),
+        expires_at = now() + make_interval(hours => :ttl)
+    WHERE status = 'running'
+      AND COALESCE(heartbeat_at, started_at) < now() - make_interval(secs => :stale)
+""")
+
+
+class JobSweeper:
+    # Фоновый поток: отмечает задачи этого процесса как живые и переводит
+    # в ошибку задачи, чей процесс перестал отмечаться (остановлен или упал)
+
+    def __init__(self, interval: int):
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self.interval <= 0 or self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="report-job-sweeper", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def sweep(self):
+        db = SessionLocal()
+        try:
+            db.execute(
+                text("UPDATE report_jobs SET heartbeat_at = now() WHERE status = 'running' AND worker = :worker"),
+                {"worker": WORKER_ID},
+            )
+            db.execute(
+                FAIL_STALE_SQL,
+                {
+                    "error": "Прервано: процесс, выполнявший задачу, остановлен.",
+                    "ttl": settings.JOB_RESULT_TTL_HOURS,
+                    "stale": settings.JOB_STALE_SEC,
+                },
+            )
+            db.commit()
+        except Exception:
+            db.rollback()
+            logger.exception("report jobs sweep failed")
+        finally:
+            db.close()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.sweep()
+
+
+sweeper = JobSweeper(settings.JOB_HEARTBEAT_SEC)
+
+
+def start_jobs():
+    # После перезапуска: задачи прежнего процесса с тем же хостом и pid — в ошибку сразу,
+    # задачи прочих остановленных процессов — по отсутствию отметки (JobSweeper);
+    # ожидающие — снова в пул
+    db = SessionLocal()
+    try:
+        db.execute(
+            text("""
+                UPDATE report_jobs
+                SET status = 'failed', error = 'Прервано перезапуском приложения.', finished_at = now(),
+                    expires_at = now() + make_interval(hours => :ttl)
+                WHERE status = 'running' AND worker = :worker
+            """),
+            {"ttl": settings.JOB_RESULT_TTL_HOURS, "worker": WORKER_ID},
+        )
+        db.execute(
+            FAIL_STALE_SQL,
+            {
+                "error": "Прервано перезапуском приложения.",
+                "ttl": settings.JOB_RESULT_TTL_HOURS,
+                "stale": settings.JOB_STALE_SEC,
+            },
+        )
+        db.execute(text("DELETE FROM report_jobs WHERE expires_at < now()"))
+        queued = db.execute(text("SELECT id FROM report_jobs WHERE status = 'queued' ORDER BY id")).scalars().all()
+        db.commit()
+    except Exception:
+        db.rollback()
+        logger.exception("report jobs recovery failed")
+        return
+    finally:
+        db.close()
+
+    for job_id in queued:
+        _get_executor().submit(_run_job, job_id)
+    sweeper.start()
+
+
+def stop_jobs():
+    global _executor
+    sweeper.stop()
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
@@ -0,0 +1,96 @@
+from functools import lru_cache
+from urllib.parse import urlencode
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from .cache import report_cache
+
+# Постраничный вывод справочников: keyset по (колонка сортировки, id).
+# Строки с NULL в колонке сортировки идут в конце, по id: сначала читается
+# ветка значений, затем, если страница не заполнена, ветка NULL.
+# Под каждую сортируемую колонку есть индекс (колонка, id), см. sql/10_list_indexes.sql.
+
+PAGE_SIZE = 50
+
+
+@lru_cache(maxsize=None)
+def _page_sql(table: str, select: str, sort: str, desc: bool, phase: str):
+    # phase: start — первая страница, value — курсор в ветке значений, null — в ветке NULL
+    op, direction = ("<", "DESC") if desc else (">", "ASC")
+
+    if sort == "id":
+        where = "" if phase == "start" else f"WHERE id {op} :after_id"
+        return text(f"SELECT {select} FROM {table} {where} ORDER BY id {direction} LIMIT :limit")
+
+    nulls_where = f"{sort} IS NULL" + (f" AND id {op} :after_id" if phase == "null" else "")
+    nulls = f"SELECT {select} FROM {table} WHERE {nulls_where} ORDER BY id {direction} LIMIT :limit"
+    if phase == "null":
+        return text(nulls)
+
+    values_where = f"({sort}, id) {op} (:after, :after_id)" if phase == "value" else f"{sort} IS NOT NULL"
+    values = f"SELECT {select} FROM {table} WHERE {values_where} ORDER BY {sort} {direction}, id {direction} LIMIT :limit"
+    return text(f"({values}) UNION ALL ({nulls}) LIMIT :limit")
+
+
+@lru_cache(maxsize=None)
+def _export_sql(table: str, select: str, sort: str, desc: bool):
+    # Тот же порядок, что и у страниц: NULL в конце, внутри — по id
+    direction = "DESC" if desc else "ASC"
+    return text(f"SELECT {select} FROM {table} ORDER BY {sort} {direction} NULLS LAST, id {direction}")
+
+
+def _list_sort(columns, params, default_sort: str):
+    keys = [key for key, _ in columns]
+    sort = params.get("sort") or default_sort
+    if sort not in keys:
+        sort = default_sort
+    return keys, sort, params.get("dir") == "desc"
+
+
+def list_export_sql(table: str, columns, params, default_sort: str = "id"):
+    # Выгрузка всего списка в текущей сортировке (sort, dir из params)
+    keys, sort, desc = _list_sort(columns, params, default_sort)
+    return _export_sql(table, ", ".join(keys), sort, desc)
+
+
+def list_page(db: Session, table: str, columns, params, default_sort: str = "id", cache_tags=()) -> dict:
+    # params — request.query_params: sort, dir, after, after_id, after_null.
+    # С cache_tags страница берётся из report_cache и вытесняется записью в эти таблицы.
+    keys, sort, desc = _list_sort(columns, params, default_sort)
+
+    after_id = params.get("after_id")
+    if after_id is None or not after_id.lstrip("-").isdigit():
+        phase, bind = "start", {}
+    elif params.get("after_null") == "1":
+        phase, bind = "null", {"after_id": int(after_id)}
+    else:
+        phase, bind = "value", {"after_id": int(after_id), "after": params.get("after", "")}
+
+    sql = _page_sql(table, ", ".join(keys), sort, desc, phase)
+    bind["limit"] = PAGE_SIZE
+    load = lambda: db.execute(sql, bind).mappings().all()
+    if cache_tags:
+        key = {"sort": sort, "desc": desc, "phase": phase, "after": bind.get("after"), "after_id": bind.get("after_id")}
+        rows, cached_at = report_cache.rows(f"list:{table}", key, cache_tags, load)
+    else:
+        rows, cached_at = load(), None
+
+    next_query = None
+    if len(rows) == PAGE_SIZE:
+        last = rows[-1]
+        cursor = {"sort": sort, "dir": "desc" if desc else "asc", "after_id": last["id"]}
+        if last[sort] is None:
+            cursor["after_null"] = 1
+        else:
+            cursor["after"] = last[sort]
+        next_query = urlencode(cursor)
+
+    return {
+        "rows": rows,
+        "sort": sort,
+        "desc": desc,
+        "next_query": next_query,
+        "is_chunk": phase != "start",
+        "cached": cached_at is not None,
+    }
@@ -1,3 +1,4 @@
+from contextlib import asynccontextmanager
 from pathlib import Path
 
 from fastapi import FastAPI, Request
@@ -6,13 +7,39 @@ from fastapi.templating import Jinja2Templates
 from starlette.exceptions import HTTPException as StarletteHTTPException
 from starlette.middleware.sessions import SessionMiddleware
 
+from .availability import start_availability
+from .cache import start_report_cache
 from .config import settings
-from .routers import auth, pages, admin, orders, reports, views_input, search, dictionaries, profile, user_orders
+from .jobs import start_jobs, stop_jobs
+from .matviews import refresher
+from .order_feed import start_order_feed
+from .pg_listener import listener
+from .stock import stock_monitor
+from .routers import auth, pages, orders, reports, views_input, search, dictionaries, profile, user_orders, order_items, api
 
 BASE_DIR = Path(__file__).resolve().parent  # .../backend/app
 templates = Jinja2Templates(directory=str(BASE_DIR / "templates"))  # [web:34][web:35]
 
-app = FastAPI(title="БД ресторана", docs_url="/docs", redoc_url=None)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Фоновые задачи приложения
+    refresher.start()
+    start_jobs()
+    start_availability()
+    start_order_feed()
+    start_report_cache()
+    listener.start()
+    stock_monitor.start()
+    yield
+    stock_monitor.stop()
+    listener.stop()
+    stop_jobs()
+    refresher.stop()
+
+
+app = FastAPI(title="БД ресторана", docs_url="/docs", redoc_url=None, lifespan=lifespan)
 
 # Сессии (для входа и роли)
 app.add_middleware(
@@ -47,11 +74,13 @@ async def custom_http_exception_handler(request: Request, exc: StarletteHTTPExce
 # Маршруты страниц
 app.include_router(auth.router)
 app.include_router(pages.router)
-app.include_router(admin.router)
 app.include_router(orders.router)
 app.include_router(reports.router)
 app.include_router(views_input.router)
 app.include_router(search.router)
 app.include_router(dictionaries.router)
 app.include_router(profile.router)
-app.include_router(user_orders.router)
\ No newline at end of file
+app.include_router(user_orders.router)
+# после user_orders: /заказ/создать объявлен раньше /заказ/{order_id}
+app.include_router(order_items.router)
+app.include_router(api.router)
\ No newline at end of file
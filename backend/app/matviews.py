@@ -0,0 +1,87 @@
+import logging
+import threading
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from .cache import report_cache
+from .config import settings
+from .db import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+# Витрины отчётов (см. sql/01_report_matviews.sql)
+MATVIEWS = ("mv_dishes_sales", "mv_dishes_by_category")
+
+# Ключ advisory-блокировки: обновление выполняет только один воркер за раз
+REFRESH_LOCK_KEY = 270001
+
+
+def refresh_matviews(db: Session, names=MATVIEWS) -> bool:
+    got_lock = db.execute(
+        text("SELECT pg_try_advisory_xact_lock(:key)"),
+        {"key": REFRESH_LOCK_KEY},
+    ).scalar_one()
+    if not got_lock:
+        # кто-то уже обновляет витрины
+        db.rollback()
+        return False
+
+    for name in names:
+        if name not in MATVIEWS:
+            raise ValueError(f"unknown materialized view: {name}")
+        db.execute(text(f"REFRESH MATERIALIZED VIEW CONCURRENTLY {name}"))
+        db.execute(
+            text("""
+                INSERT INTO report_refresh_log (view_name, refreshed_at)
+                VALUES (:name, clock_timestamp())
+                ON CONFLICT (view_name) DO UPDATE SET refreshed_at = EXCLUDED.refreshed_at
+            """),
+            {"name": name},
+        )
+    db.commit()
+    report_cache.invalidate(*names)
+    return True
+
+
+def refreshed_at(db: Session, name: str):
+    return db.execute(
+        text("SELECT refreshed_at FROM report_refresh_log WHERE view_name = :name"),
+        {"name": name},
+    ).scalar()
+
+
+class MatviewRefresher:
+    # Фоновый поток, периодически обновляющий витрины
+
+    def __init__(self, interval: int):
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self.interval <= 0 or self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="matview-refresher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            db = SessionLocal()
+            try:
+                refresh_matviews(db)
+            except Exception:
+                db.rollback()
+                logger.exception("matview refresh failed")
+            finally:
+                db.close()
+
+
+refresher = MatviewRefresher(settings.REPORT_REFRESH_INTERVAL_SEC)
@@ -0,0 +1,105 @@
+import asyncio
+import json
+import logging
+import threading
+from pathlib import Path
+
+from fastapi.templating import Jinja2Templates
+from sqlalchemy import text
+
+from .db import SessionLocal
+from .pg_listener import listener
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = Path(__file__).resolve().parent
+templates = Jinja2Templates(directory=str(BASE_DIR / "templates"))
+
+# Живой список заказов: триггер orders_notify (sql/16_orders_notify.sql) шлёт NOTIFY,
+# поток pg_listener этого воркера один раз читает и рендерит изменённую строку
+# и раздаёт готовое событие в очереди подключённых клиентов (/заказы/поток).
+
+ORDER_ROW_SQL = text("""
+    SELECT
+      o.id,
+      o.order_time,
+      o.status,
+      o.total_amount,
+      g.last_name || ' ' || g.first_name AS guest_name,
+      t.table_number AS table_number,
+      w.last_name || ' ' || w.first_name AS waiter_name
+    FROM orders o
+    LEFT JOIN guests g ON g.id = o.guest_id
+    LEFT JOIN tables t ON t.id = o.table_id
+    LEFT JOIN waiters w ON w.id = o.waiter_id
+    WHERE o.id = :id
+""")
+
+QUEUE_SIZE = 100
+
+
+class OrderFeed:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._clients = set()        # {(loop, queue)}
+
+    def subscribe(self) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+        with self._lock:
+            self._clients.add((asyncio.get_running_loop(), queue))
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        with self._lock:
+            self._clients = {c for c in self._clients if c[1] is not queue}
+
+    def publish(self, event: str, data: str = ""):
+        with self._lock:
+            clients = list(self._clients)
+        for loop, queue in clients:
+            loop.call_soon_threadsafe(_offer, queue, (event, data))
+
+    def on_notify(self, payload: str):
+        note = json.loads(payload)
+        if not self._clients:
+            return
+        if note["op"] == "DELETE":
+            self.publish("delete", str(note["id"]))
+            return
+
+        db = SessionLocal()
+        try:
+            row = db.execute(ORDER_ROW_SQL, {"id": note["id"]}).mappings().first()
+        finally:
+            db.close()
+        if row is None:
+            return
+        html = templates.get_template("orders/_row.html").render(r=row)
+        self.publish("insert" if note["op"] == "INSERT" else "update", html)
+
+    def on_reconnect(self):
+        # уведомления за время разрыва потеряны — клиенты перечитывают страницу
+        self.publish("reload")
+
+
+def _offer(queue: asyncio.Queue, item):
+    # медленный клиент: вместо накопленных изменений — одна команда перечитать страницу
+    try:
+        queue.put_nowait(item)
+    except asyncio.QueueFull:
+        while not queue.empty():
+            queue.get_nowait()
+        queue.put_nowait(("reload", ""))
+
+
+def sse_message(event: str, data: str) -> str:
+    lines = "".join(f"data: {line}\n" for line in (data.splitlines() or [""]))
+    return f"event: {event}\n{lines}\n"
+
+
+order_feed = OrderFeed()
+
+
+def start_order_feed():
+    listener.subscribe("orders_changed", order_feed.on_notify)
+    listener.on_reconnect(order_feed.on_reconnect)
@@ -0,0 +1,89 @@
+import logging
+import select
+import threading
+
+from .db import engine
+
+logger = logging.getLogger(__name__)
+
+
+class PgListener:
+    # Один поток на воркер: LISTEN на отдельном соединении и раздача
+    # уведомлений подписчикам. После каждого подключения, в том числе первого,
+    # вызываются обработчики on_reconnect: изменения до LISTEN и за время
+    # разрыва уведомлений не дали, подписчики перечитывают состояние.
+
+    def __init__(self, poll_timeout: float = 5.0):
+        self.poll_timeout = poll_timeout
+        self._handlers = {}
+        self._reconnect_handlers = []
+        self._stop = threading.Event()
+        self._thread = None
+
+    def subscribe(self, channel: str, handler):
+        self._handlers.setdefault(channel, []).append(handler)
+
+    def on_reconnect(self, handler):
+        self._reconnect_handlers.append(handler)
+
+    def start(self):
+        if self._thread is not None or not self._handlers:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="pg-listener", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.poll_timeout + 1)
+            self._thread = None
+
+    def _connect(self):
+        # соединение забирается из пула насовсем
+        conn = engine.raw_connection()
+        conn.detach()
+        dbapi = conn.dbapi_connection
+        dbapi.autocommit = True
+        with dbapi.cursor() as cur:
+            for channel in self._handlers:
+                cur.execute(f'LISTEN "{channel}"')
+        return dbapi
+
+    def _run(self):
+        while not self._stop.is_set():
+            dbapi = None
+            try:
+                dbapi = self._connect()
+                for handler in self._reconnect_handlers:
+                    try:
+                        handler()
+                    except Exception:
+                        logger.exception("reconnect handler failed")
+                self._loop(dbapi)
+            except Exception:
+                logger.exception("pg listener failed, reconnecting")
+                self._stop.wait(self.poll_timeout)
+            finally:
+                if dbapi is not None:
+                    try:
+                        dbapi.close()
+                    except Exception:
+                        pass
+
+    def _loop(self, dbapi):
+        while not self._stop.is_set():
+            ready, _, _ = select.select([dbapi], [], [], self.poll_timeout)
+            if not ready:
+                continue
+            dbapi.poll()
+            while dbapi.notifies:
+                note = dbapi.notifies.pop(0)
+                for handler in self._handlers.get(note.channel, []):
+                    try:
+                        handler(note.payload)
+                    except Exception:
+                        logger.exception("handler for %s failed", note.channel)
+
+
+listener = PgListener()
@@ -0,0 +1,167 @@
+import hashlib
+import json
+from datetime import date, time
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import Response
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from ..analytics import heatmap, heatmap_json
+from ..db import get_db
+from ..deps import require_login
+from ..serializers import columnar
+from . import reports as r
+
+router = APIRouter(prefix="/api/отчёты", tags=["API отчётов"])
+
+MAX_PAGE_SIZE = 5000
+
+
+# Разбор параметров: неверное значение -> ValueError -> 422, а не ошибка приведения в БД
+def _iso_date(value: str) -> str:
+    return date.fromisoformat(value).isoformat()
+
+
+def _iso_time(value: str) -> str:
+    return time.fromisoformat(value).isoformat()
+
+
+# Отчёты API: имя -> запрос, колонки и параметры (параметр SQL -> (параметр запроса, тип))
+API_REPORTS = {
+    "revenue": {
+        "sql": r.REVENUE_SQL,
+        "columns": r.REVENUE_COLUMNS,
+        "params": {"d1": ("date_from", _iso_date), "d2": ("date_to", _iso_date)},
+    },
+    "waiters": {
+        "sql": r.WAITERS_SQL,
+        "columns": r.WAITERS_COLUMNS,
+        "params": {"d1": ("date_from", _iso_date), "d2": ("date_to", _iso_date)},
+    },
+    "dishes_sales": {
+        "sql": r.DISHES_SALES_SQL,
+        "columns": r.DISHES_SALES_COLUMNS,
+        "params": {},
+    },
+    "guest_orders": {
+        "sql": r.GUEST_ORDERS_SQL,
+        "columns": r.GUEST_ORDERS_COLUMNS,
+        "params": {"guest_id": ("guest_id", int)},
+    },
+    "free_tables": {
+        "sql": r.FREE_TABLES_SQL,
+        "columns": r.FREE_TABLES_COLUMNS,
+        "params": {"d": ("date", _iso_date), "s": ("start", _iso_time), "e": ("end", _iso_time), "g": ("guests", int)},
+    },
+    "guest_statistics": {
+        "sql": r.GUEST_STATISTICS_SQL,
+        "columns": r.GUEST_STATISTICS_COLUMNS,
+        "params": {"limit": ("limit", int)},
+    },
+    "single_dish_sales": {
+        "sql": r.SINGLE_DISH_SALES_SQL,
+        "columns": r.SINGLE_DISH_SALES_COLUMNS,
+        "params": {"dish_name": ("dish_name", str)},
+    },
+    "category_sales": {
+        "sql": r.CATEGORY_SALES_SQL,
+        "columns": r.CATEGORY_SALES_COLUMNS,
+        "params": {"category": ("category", str)},
+    },
+    "dishes_by_category": {
+        "sql": r.DISHES_BY_CATEGORY_SQL,
+        "columns": r.DISHES_BY_CATEGORY_COLUMNS,
+        "params": {"category": ("category", str)},
+    },
+}
+
+# Страница отчёта: запрос оборачивается один раз, при импорте
+for _report in API_REPORTS.values():
+    _report["page_sql"] = text(
+        f"SELECT * FROM ({_report['sql'].text}) AS report LIMIT :_limit OFFSET :_offset"
+    )
+
+
+def _sql_params(report: dict, request: Request) -> dict:
+    params = {}
+    for sql_name, (query_name, py_type) in report["params"].items():
+        value = request.query_params.get(query_name)
+        if value is None or value.strip() == "":
+            raise HTTPException(status_code=400, detail=f"Не задан параметр {query_name}.")
+        try:
+            params[sql_name] = py_type(value.strip())
+        except ValueError:
+            raise HTTPException(status_code=422, detail=f"Неверное значение параметра {query_name}.")
+    return params
+
+
+def json_response(request: Request, payload: dict) -> Response:
+    body = json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+
+    if etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+@router.get("")
+def api_reports_index(request: Request):
+    require_login(request)
+    return {
+        name: {
+            "columns": [key for key, _ in report["columns"]],
+            "params": [query_name for query_name, _ in report["params"].values()],
+        }
+        for name, report in API_REPORTS.items()
+    } | {"heatmap": {"params": ["date_to", "weeks", "window", "dish_name"]}}
+
+
+@router.get("/heatmap")
+def api_heatmap(
+    request: Request,
+    db: Session = Depends(get_db),
+    date_to: str = Query(""),
+    weeks: int = Query(12, ge=1),
+    window: int = Query(4, ge=1),
+    dish_name: str = Query(""),
+):
+    require_login(request)
+    try:
+        d2 = date.fromisoformat(date_to) if date_to else date.today()
+    except ValueError:
+        raise HTTPException(status_code=422, detail="Неверное значение параметра date_to.")
+    result = heatmap(db, d2, weeks, window, dish_name.strip())
+    return json_response(request, heatmap_json(result))
+
+
+@router.get("/{name}")
+def api_report(
+    name: str,
+    request: Request,
+    db: Session = Depends(get_db),
+    offset: int = Query(0, ge=0),
+    limit: int = Query(1000, ge=1, le=MAX_PAGE_SIZE),
+):
+    require_login(request)
+    report = API_REPORTS.get(name)
+    if report is None:
+        raise HTTPException(status_code=404, detail="Отчёт не найден.")
+
+    params = _sql_params(report, request)
+    # одна лишняя строка показывает, есть ли следующая страница
+    result = db.execute(report["page_sql"], {**params, "_limit": limit + 1, "_offset": offset})
+    keys = list(result.keys())
+    rows = result.all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    payload = columnar(keys, rows, report["columns"])
+    payload["page"] = {
+        "offset": offset,
+        "limit": limit,
+        "count": len(rows),
+        "next_offset": offset + limit if has_more else None,
+    }
+    return json_response(request, payload)
@@ -6,7 +6,9 @@ from fastapi.templating import Jinja2Templates
 from sqlalchemy import text
 from sqlalchemy.orm import Session
 
+from ..cache import report_cache
 from ..db import get_db
+from ..guests import find_or_create_guest
 
 router = APIRouter()
 
@@ -52,22 +54,14 @@ def login(
 
     # Автопривязка: если guest_id ещё не задан — создаём guests и привязываем
     if guest_id is None:
-        new_guest = db.execute(
-            text("""
-                INSERT INTO guests (last_name, first_name)
-                VALUES (:last_name, :first_name)
-                RETURNING id
-            """),
-            {"last_name": row["login"], "first_name": "Пользователь"},
-        ).mappings().first()
-
-        guest_id = new_guest["id"]
+        guest_id = find_or_create_guest(db, row["login"], "Пользователь")
 
         db.execute(
             text("UPDATE users SET guest_id = :guest_id WHERE id = :uid"),
             {"guest_id": guest_id, "uid": user_id},
         )
         db.commit()
+        report_cache.invalidate("guests")
 
     request.session["user"] = {
         "id": user_id,
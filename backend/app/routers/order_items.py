@@ -1,3 +1,4 @@
+from decimal import Decimal
 from pathlib import Path
 
 from fastapi import APIRouter, Depends, Form, Request
@@ -6,62 +7,144 @@ from fastapi.templating import Jinja2Templates
 from sqlalchemy import text
 from sqlalchemy.orm import Session
 
+from ..cache import report_cache
 from ..db import get_db
-from ..deps import get_current_user
+from ..deps import require_login
 
 router = APIRouter(tags=["Позиции заказа"])
 
 BASE_DIR = Path(__file__).resolve().parents[1]
 templates = Jinja2Templates(directory=str(BASE_DIR / "templates"))
 
+# Корзина пользователя хранится в сессии: добавление и правка позиций БД не трогают.
+# «Оформить» записывает все позиции и сумму заказа одной транзакцией.
+# Сессия — подписанная cookie (~4 КБ), поэтому в ней только номера блюд и количества:
+# {"order_id": ..., "items": {"<dish_id>": qty}}. Названия и цены берутся из dishes
+# при показе, и та же текущая цена записывается при оформлении.
+# В сессии одна корзина: пока она не оформлена или не очищена, блюда в другой заказ
+# не добавляются.
+
+MAX_CART_QTY = 999
+MAX_CART_LINES = 50
+
+# доступ: admin или владелец заказа (по guest_id) — в том же запросе, что и заказ
+ORDER_SQL = text("""
+    SELECT o.id, o.order_time, o.total_amount, o.status
+    FROM orders o
+    WHERE o.id = :oid
+      AND (:is_admin OR EXISTS (
+        SELECT 1 FROM users u WHERE u.id = :uid AND u.guest_id = o.guest_id
+      ))
+""")
+
+ORDER_ITEMS_SQL = text("""
+    SELECT d.name, oi.quantity, oi.price, (oi.quantity * oi.price) AS line_total
+    FROM order_items oi
+    JOIN dishes d ON d.id = oi.dish_id
+    WHERE oi.order_id = :oid
+    ORDER BY d.name
+""")
+
+DISHES_SQL = text("SELECT id, name, price FROM dishes ORDER BY name")
+
+# Цена позиции — текущая цена блюда на момент оформления, как и в корзине
+SUBMIT_CART_SQL = text("""
+    INSERT INTO order_items (order_id, dish_id, quantity, price)
+    SELECT :oid, d.id, c.qty, d.price
+    FROM unnest(CAST(:dish_ids AS integer[]), CAST(:qtys AS integer[])) AS c(dish_id, qty)
+    JOIN dishes d ON d.id = c.dish_id
+    ON CONFLICT (order_id, dish_id)
+    DO UPDATE SET quantity = order_items.quantity + EXCLUDED.quantity
+""")
+
+
+def _get_order(db: Session, user: dict, order_id: int):
+    return db.execute(
+        ORDER_SQL,
+        {"oid": order_id, "uid": user["id"], "is_admin": user.get("role") == "admin"},
+    ).mappings().first()
+
+
+def _dishes(db: Session):
+    rows, _ = report_cache.rows("order_dishes", {}, ("dishes",), lambda: db.execute(DISHES_SQL).mappings().all())
+    return rows
+
+
+def _session_cart(request: Request, order_id: int) -> dict:
+    # {dish_id: qty} корзины этого заказа; корзина другого заказа не трогается
+    cart = request.session.get("cart") or {}
+    if cart.get("order_id") != order_id:
+        return {}
+    return {int(dish_id): qty for dish_id, qty in cart.get("items", {}).items()}
+
+
+def _other_cart_order(request: Request, order_id: int):
+    # Номер другого заказа, для которого в сессии уже собрана корзина
+    cart = request.session.get("cart") or {}
+    if cart.get("items") and cart.get("order_id") != order_id:
+        return cart["order_id"]
+    return None
+
+
+def _save_cart(request: Request, order_id: int, items: dict):
+    if items:
+        request.session["cart"] = {"order_id": order_id, "items": {str(k): v for k, v in items.items()}}
+    else:
+        request.session.pop("cart", None)
 
-def _ensure_user_order(db: Session, user: dict, order_id: int) -> bool:
-    # доступ: только admin или владелец заказа (по guest_id)
-    if user.get("role") == "admin":
-        return True
 
-    row = db.execute(
-        text("""
-            SELECT 1
-            FROM orders o
-            JOIN users u ON u.guest_id = o.guest_id
-            WHERE o.id = :oid AND u.id = :uid
-        """),
-        {"oid": order_id, "uid": user["id"]},
-    ).first()
-    return row is not None
+def _cart_lines(db: Session, items: dict) -> list[dict]:
+    # Строки для показа по текущим dishes; удалённые блюда не показываются и не оформляются
+    return [
+        {"dish_id": d["id"], "name": d["name"], "price": d["price"], "qty": items[d["id"]],
+         "line_total": d["price"] * items[d["id"]]}
+        for d in _dishes(db)
+        if d["id"] in items
+    ]
+
+
+def _cart_context(request: Request, db: Session, order_id: int, error: str = "") -> dict:
+    lines = _cart_lines(db, _session_cart(request, order_id))
+    return {
+        "order_id": order_id,
+        "cart": lines,
+        "cart_total": sum((line["line_total"] for line in lines), Decimal(0)),
+        "cart_error": error,
+        "other_cart_order": _other_cart_order(request, order_id),
+    }
+
+
+def _cart_response(request: Request, db: Session, order_id: int, error: str = ""):
+    # htmx получает только блок корзины; без htmx — обычный возврат на страницу заказа
+    if request.headers.get("hx-request"):
+        return templates.TemplateResponse(
+            "orders/_cart.html",
+            {"request": request, **_cart_context(request, db, order_id, error)},
+        )
+    return RedirectResponse(url=f"/заказ/{order_id}", status_code=303)
 
 
 @router.get("/заказ/{order_id}", response_class=HTMLResponse)
 def order_page(order_id: int, request: Request, db: Session = Depends(get_db)):
-    user = get_current_user(request)
+    user = require_login(request)
 
-    if not _ensure_user_order(db, user, order_id):
+    order = _get_order(db, user, order_id)
+    if not order:
         return RedirectResponse(url="/профиль", status_code=303)
 
-    order = db.execute(
-        text("SELECT id, order_time, total_amount, status FROM orders WHERE id = :oid"),
-        {"oid": order_id},
-    ).mappings().first()
-
-    items = db.execute(
-        text("""
-            SELECT oi.id, d.name, oi.qty, oi.price, (oi.qty * oi.price) AS line_total
-            FROM order_items oi
-            JOIN dishes d ON d.id = oi.dish_id
-            WHERE oi.order_id = :oid
-            ORDER BY oi.id
-        """),
-        {"oid": order_id},
-    ).mappings().all()
-
-    dishes = db.execute(
-        text("SELECT id, name, price FROM dishes ORDER BY name"),
-    ).mappings().all()
+    items = db.execute(ORDER_ITEMS_SQL, {"oid": order_id}).mappings().all()
 
     return templates.TemplateResponse(
         "orders/order_edit.html",
-        {"request": request, "user": user, "title": f"Заказ #{order_id}", "order": order, "items": items, "dishes": dishes},
+        {
+            "request": request,
+            "user": user,
+            "title": f"Заказ #{order_id}",
+            "order": order,
+            "items": items,
+            "dishes": _dishes(db),
+            **_cart_context(request, db, order_id),
+        },
     )
 
 
@@ -73,32 +156,74 @@ def add_item(
     dish_id: int = Form(...),
     qty: int = Form(...),
 ):
-    user = get_current_user(request)
-
-    if not _ensure_user_order(db, user, order_id):
+    user = require_login(request)
+    if not _get_order(db, user, order_id):
         return RedirectResponse(url="/профиль", status_code=303)
 
-    dish = db.execute(
-        text("SELECT id, price FROM dishes WHERE id = :did"),
-        {"did": dish_id},
-    ).mappings().first()
+    other = _other_cart_order(request, order_id)
+    if other is not None:
+        return _cart_response(
+            request, db, order_id,
+            f"В корзине блюда заказа №{other}: оформите или очистите её, прежде чем собирать этот заказ.",
+        )
 
-    if not dish:
-        return RedirectResponse(url=f"/заказ/{order_id}", status_code=303)
-
-    # upsert: если блюдо уже есть в заказе — увеличиваем qty
-    db.execute(
-        text("""
-            INSERT INTO order_items (order_id, dish_id, qty, price)
-            VALUES (:oid, :did, :qty, :price)
-            ON CONFLICT (order_id, dish_id)
-            DO UPDATE SET qty = order_items.qty + EXCLUDED.qty
-        """),
-        {"oid": order_id, "did": dish_id, "qty": qty, "price": dish["price"]},
-    )
+    items = _session_cart(request, order_id)
+    if qty < 1 or not any(d["id"] == dish_id for d in _dishes(db)):
+        return _cart_response(request, db, order_id, "Неверное блюдо или количество.")
+    if dish_id not in items and len(items) >= MAX_CART_LINES:
+        return _cart_response(request, db, order_id, f"В корзине не больше {MAX_CART_LINES} разных блюд.")
+
+    items[dish_id] = min(items.get(dish_id, 0) + qty, MAX_CART_QTY)
+    _save_cart(request, order_id, items)
+    return _cart_response(request, db, order_id)
+
+
+@router.post("/заказ/{order_id}/корзина")
+def update_cart_item(
+    order_id: int,
+    request: Request,
+    db: Session = Depends(get_db),
+    dish_id: int = Form(...),
+    qty: int = Form(...),
+):
+    # qty = 0 убирает позицию
+    require_login(request)
+    items = _session_cart(request, order_id)
+    if qty <= 0:
+        items.pop(dish_id, None)
+    elif dish_id in items:
+        items[dish_id] = min(qty, MAX_CART_QTY)
+
+    if items or _other_cart_order(request, order_id) is None:
+        _save_cart(request, order_id, items)
+    return _cart_response(request, db, order_id)
+
+
+@router.post("/заказ/{order_id}/очистить")
+def clear_cart(order_id: int, request: Request, db: Session = Depends(get_db)):
+    # Очищается корзина, собранная для этого заказа, или — из предупреждения — для другого
+    require_login(request)
+    request.session.pop("cart", None)
+    return _cart_response(request, db, order_id)
+
+
+@router.post("/заказ/{order_id}/оформить")
+def submit_cart(order_id: int, request: Request, db: Session = Depends(get_db)):
+    user = require_login(request)
+
+    if not _get_order(db, user, order_id):
+        return RedirectResponse(url="/профиль", status_code=303)
 
-    # пересчёт суммы
-    db.execute(text("SELECT recalc_order_total(:oid)"), {"oid": order_id})
-    db.commit()
+    items = _session_cart(request, order_id)
+    if items:
+        db.execute(
+            SUBMIT_CART_SQL,
+            {"oid": order_id, "dish_ids": list(items), "qtys": list(items.values())},
+        )
+        # пересчёт суммы — в той же транзакции
+        db.execute(text("SELECT recalc_order_total(:oid)"), {"oid": order_id})
+        db.commit()
+        report_cache.invalidate("order_items", "orders")
+        _save_cart(request, order_id, {})
 
     return RedirectResponse(url=f"/заказ/{order_id}", status_code=303)
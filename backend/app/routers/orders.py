@@ -1,15 +1,19 @@
+import asyncio
 from pathlib import Path
 from datetime import datetime
 
 from fastapi import APIRouter, Depends, Form, Request, Query
-from fastapi.responses import HTMLResponse, RedirectResponse
+from fastapi.responses import HTMLResponse, RedirectResponse, StreamingResponse
 from fastapi.templating import Jinja2Templates
 from sqlalchemy import text
 from sqlalchemy.orm import Session
 from passlib.hash import pbkdf2_sha256  # <-- ВАЖНО: вместо bcrypt/bcrypt_sha256
 
+from ..cache import report_cache
 from ..db import get_db
 from ..deps import require_login, require_admin
+from ..guests import find_or_create_guest, parse_birth_date
+from ..order_feed import order_feed, sse_message
 
 
 router = APIRouter(prefix="/заказы", tags=["Заказы"])
@@ -117,6 +121,37 @@ def orders_chunk(
     )
 
 
+# Живой список: новые и изменённые строки приходят событиями SSE (app/order_feed.py)
+
+SSE_PING_SEC = 15
+
+
+async def _order_events(request: Request, queue: asyncio.Queue):
+    try:
+        yield "retry: 5000\n\n"
+        while True:
+            try:
+                event, data = await asyncio.wait_for(queue.get(), timeout=SSE_PING_SEC)
+            except asyncio.TimeoutError:
+                if await request.is_disconnected():
+                    return
+                yield ": ping\n\n"
+                continue
+            yield sse_message(event, data)
+    finally:
+        order_feed.unsubscribe(queue)
+
+
+@router.get("/поток")
+async def orders_stream(request: Request):
+    require_login(request)
+    return StreamingResponse(
+        _order_events(request, order_feed.subscribe()),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @router.get("/создать", response_class=HTMLResponse)
 def order_create_form(request: Request, db: Session = Depends(get_db)):
     user = require_admin(request)
@@ -145,6 +180,7 @@ def order_create(
     guest_last_name: str = Form(...),
     guest_first_name: str = Form(...),
     guest_middle_name: str = Form(""),
+    guest_birth_date: str = Form(""),
 
     # опционально аккаунт
     create_user: str = Form("0"),
@@ -179,19 +215,10 @@ def order_create(
     }
     status_ru = STATUS_MAP.get((status or "").strip().lower(), "создан")
 
-    # 1) создаём гостя
-    guest_id = db.execute(
-        text("""
-            INSERT INTO guests (last_name, first_name, middle_name, birth_date, total_orders, total_discount)
-            VALUES (:ln, :fn, NULLIF(:mn, ''), NULL, 0, 0)
-            RETURNING id
-        """),
-        {
-            "ln": guest_last_name.strip(),
-            "fn": guest_first_name.strip(),
-            "mn": guest_middle_name.strip(),
-        },
-    ).scalar_one()
+    # 1) гость: существующий с тем же ФИО и датой рождения или новый
+    guest_id = find_or_create_guest(
+        db, guest_last_name, guest_first_name, guest_middle_name, parse_birth_date(guest_birth_date)
+    )
 
     # 2) опционально создаём аккаунт (пароль -> хэш PBKDF2-SHA256)
     if (create_user or "").strip() == "1":
@@ -239,6 +266,7 @@ def order_create(
     ).scalar_one()
 
     db.commit()
+    report_cache.invalidate("orders", "guests")
     return RedirectResponse(url=f"/заказы/{order_id}", status_code=303)
 
 
@@ -325,6 +353,7 @@ def order_save(
         {"id": order_id, "guest_id": guest_id, "table_id": table_id, "waiter_id": waiter_id, "status": status.strip()},
     )
     db.commit()
+    report_cache.invalidate("orders")
     return RedirectResponse(url=f"/заказы/{order_id}", status_code=303)
 
 
@@ -350,6 +379,7 @@ def order_item_add(
         {"order_id": order_id, "dish_id": dish_id, "quantity": quantity},
     )
     db.commit()
+    report_cache.invalidate("order_items")
     return RedirectResponse(url=f"/заказы/{order_id}", status_code=303)
 
 
@@ -374,6 +404,7 @@ def order_item_update(
         {"order_id": order_id, "dish_id": dish_id, "quantity": quantity},
     )
     db.commit()
+    report_cache.invalidate("order_items")
     return RedirectResponse(url=f"/заказы/{order_id}", status_code=303)
 
 
@@ -385,4 +416,5 @@ def order_item_delete(order_id: int, dish_id: int, request: Request, db: Session
         {"order_id": order_id, "dish_id": dish_id},
     )
     db.commit()
+    report_cache.invalidate("order_items")
     return RedirectResponse(url=f"/заказы/{order_id}", status_code=303)
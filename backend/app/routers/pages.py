@@ -6,6 +6,7 @@ from fastapi.templating import Jinja2Templates
 from sqlalchemy import text
 from sqlalchemy.orm import Session
 
+from ..cache import report_cache
 from ..db import get_db
 
 
@@ -25,9 +26,21 @@ def home(request: Request, db: Session = Depends(get_db)):
 
     stats = None
     if user:
-        orders_count = db.execute(text("SELECT COUNT(*) FROM orders")).scalar_one()
-        total_revenue = db.execute(text("SELECT COALESCE(SUM(total_amount), 0) FROM orders")).scalar_one()
-        stats = {"orders_count": orders_count, "total_revenue": total_revenue}
+        # Сумма дневной свёртки (sql/02_revenue_daily.sql) — строка на день, а не на заказ;
+        # заказы без order_time в свёртку не попадают. Кэш до записи в orders
+        rows, _ = report_cache.rows(
+            "home_stats",
+            {},
+            ("orders",),
+            lambda: db.execute(
+                text("""
+                    SELECT COALESCE(SUM(orders_count), 0) AS orders_count,
+                           COALESCE(SUM(revenue), 0) AS total_revenue
+                    FROM revenue_daily
+                """)
+            ).mappings().all(),
+        )
+        stats = rows[0] if rows else {"orders_count": 0, "total_revenue": 0}
 
     return templates.TemplateResponse(
         "home.html",
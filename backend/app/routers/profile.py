@@ -1,3 +1,5 @@
+from datetime import datetime
+from decimal import Decimal
 from pathlib import Path
 
 from fastapi import APIRouter, Depends, Request
@@ -14,43 +16,60 @@ router = APIRouter(tags=["Профиль"])
 BASE_DIR = Path(__file__).resolve().parents[1]
 templates = Jinja2Templates(directory=str(BASE_DIR / "templates"))
 
+# Профиль за один запрос: пользователь и итоги гостя — по первичным ключам
+# (итоги поддерживает триггер, sql/14_guest_totals.sql), последние 50 заказов —
+# top-N по индексу orders (guest_id, order_time DESC) (sql/15_profile_orders_index.sql).
+# Отменённые заказы не входят ни в итоги, ни в список.
+# Сумма передаётся в JSON строкой, чтобы не терять точность numeric.
+PROFILE_SQL = text("""
+    SELECT
+      u.guest_id,
+      g.total_orders AS orders_count,
+      g.total_spent,
+      g.last_visit,
+      COALESCE(r.orders, '[]'::json) AS orders
+    FROM users u
+    LEFT JOIN guests g ON g.id = u.guest_id
+    LEFT JOIN LATERAL (
+      SELECT json_agg(json_build_object(
+               'id', o.id,
+               'order_time', o.order_time,
+               'total_amount', o.total_amount::text,
+               'status', o.status
+             ) ORDER BY o.order_time DESC) AS orders
+      FROM (
+        SELECT id, order_time, total_amount, status
+        FROM orders
+        WHERE guest_id = u.guest_id
+          AND COALESCE(status, '') NOT IN ('отменён', 'cancelled')
+        ORDER BY order_time DESC
+        LIMIT 50
+      ) o
+    ) r ON true
+    WHERE u.id = :uid
+""")
+
+
 @router.get("/профиль", response_class=HTMLResponse)
 def profile_page(request: Request, db: Session = Depends(get_db)):
     user = get_current_user(request)
 
-    # Берём guest_id, чтобы понимать "чьи" заказы
-    row = db.execute(
-        text("SELECT guest_id FROM users WHERE id = :uid"),
-        {"uid": user["id"]},
-    ).mappings().first()
+    row = db.execute(PROFILE_SQL, {"uid": user["id"]}).mappings().first()
 
-    guest_id = row["guest_id"] if row else None
-
-    stats = {"orders_count": 0, "total_spent": 0}
+    stats = {"orders_count": 0, "total_spent": 0, "last_visit": None}
     orders = []
 
-    if guest_id is not None:
-        stats = db.execute(
-            text("""
-                SELECT
-                  COUNT(*) AS orders_count,
-                  COALESCE(SUM(total_amount), 0) AS total_spent
-                FROM orders
-                WHERE guest_id = :guest_id
-            """),
-            {"guest_id": guest_id},
-        ).mappings().first() or stats
-
-        orders = db.execute(
-            text("""
-                SELECT id, order_time, total_amount, status
-                FROM orders
-                WHERE guest_id = :guest_id
-                ORDER BY order_time DESC
-                LIMIT 50
-            """),
-            {"guest_id": guest_id},
-        ).mappings().all()
+    if row and row["guest_id"] is not None:
+        stats = row
+        orders = [
+            {
+                "id": o["id"],
+                "order_time": datetime.fromisoformat(o["order_time"]) if o["order_time"] else None,
+                "total_amount": Decimal(o["total_amount"]) if o["total_amount"] is not None else None,
+                "status": o["status"],
+            }
+            for o in row["orders"]
+        ]
 
     return templates.TemplateResponse(
         "profile/profile.html",
@@ -1,12 +1,33 @@
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import date, datetime, time, timedelta
 from pathlib import Path
-from fastapi import APIRouter, Depends, Form, Request
-from fastapi.responses import HTMLResponse
+from fastapi import APIRouter, Depends, Form, HTTPException, Query, Request
+from fastapi.responses import HTMLResponse, RedirectResponse
 from fastapi.templating import Jinja2Templates
 from sqlalchemy import text
 from sqlalchemy.orm import Session
 
-from ..db import get_db
-from ..deps import require_login
+from ..analytics import (
+    FORECAST_PRODUCT_COLUMNS,
+    HEATMAP_COLUMNS,
+    HEATMAP_METRICS,
+    demand_forecast,
+    forecast_dish_columns,
+    forecast_dish_rows,
+    forecast_product_rows,
+    heatmap,
+    heatmap_rows,
+)
+from ..availability import availability
+from ..cache import report_cache
+from ..config import settings
+from ..db import SessionLocal, get_db
+from ..deps import require_admin, require_login
+from ..guests import MERGE_GUESTS_COLUMNS, merge_duplicate_guests
+from ..export import export_response, rows_csv_response
+from ..jobs import JOB_KINDS, JOB_STATUS_TITLES, get_job, register_job, submit_job
+from ..matviews import MATVIEWS, refresh_matviews, refreshed_at
+from ..stock import STOCK_ALERTS_COLUMNS, STOCK_ALERTS_SQL, stock_alert_days, stock_alerts
 
 router = APIRouter(prefix="/отчёты", tags=["Отчёты"])
 
@@ -14,27 +35,516 @@ BASE_DIR = Path(__file__).resolve().parents[1]
 templates = Jinja2Templates(directory=str(BASE_DIR / "templates"))
 
 
+# Запросы и колонки отчётов: общие для страницы и для выгрузки (CSV/XLSX)
+
+# Дневная свёртка вместо сканирования orders (см. sql/02_revenue_daily.sql)
+REVENUE_SQL = text("""
+    SELECT
+      day,
+      orders_count,
+      revenue,
+      ROUND(revenue / NULLIF(orders_count, 0), 2) AS avg_check
+    FROM revenue_daily
+    WHERE day BETWEEN CAST(:d1 AS date) AND CAST(:d2 AS date)
+      AND orders_count <> 0
+    ORDER BY day
+""")
+
+REVENUE_COLUMNS = [
+    ("day", "День"),
+    ("orders_count", "Заказов"),
+    ("revenue", "Выручка"),
+    ("avg_check", "Средний чек"),
+]
+
+# Свёртка по официантам и дням (см. sql/09_waiter_daily.sql)
+WAITERS_SQL = text("""
+    SELECT
+      w.id AS waiter_id,
+      w.last_name || ' ' || w.first_name AS waiter_name,
+      SUM(s.orders_count) AS orders_count,
+      SUM(s.revenue) AS revenue,
+      ROUND(SUM(s.revenue) / NULLIF(SUM(s.orders_count), 0), 2) AS avg_check,
+      ROUND(SUM(s.paid_seconds) / NULLIF(SUM(s.paid_count), 0) / 60, 1) AS avg_minutes_to_paid
+    FROM waiter_daily s
+    JOIN waiters w ON w.id = s.waiter_id
+    WHERE s.day BETWEEN CAST(:d1 AS date) AND CAST(:d2 AS date)
+    GROUP BY w.id, w.last_name, w.first_name
+    HAVING SUM(s.orders_count) <> 0
+    ORDER BY revenue DESC
+""")
+
+WAITERS_COLUMNS = [
+    ("waiter_id", "ID"),
+    ("waiter_name", "Официант"),
+    ("orders_count", "Заказов"),
+    ("revenue", "Выручка"),
+    ("avg_check", "Средний чек"),
+    ("avg_minutes_to_paid", "До оплаты, мин (в среднем)"),
+]
+
+DISHES_SALES_SQL = text(
+    "SELECT dish_name, total_sold, total_revenue, avg_price FROM mv_dishes_sales ORDER BY row_id"
+)
+
+DISHES_SALES_COLUMNS = [
+    ("dish_name", "Блюдо"),
+    ("total_sold", "Продано (шт.)"),
+    ("total_revenue", "Выручка"),
+    ("avg_price", "Средняя сумма позиции"),
+]
+
+GUEST_ORDERS_SQL = text("SELECT * FROM guest_orders(:guest_id)")
+
+GUEST_ORDERS_COLUMNS = [
+    ("id", "Номер заказа"),
+    ("guest_id", "Гость"),
+    ("table_id", "Стол"),
+    ("waiter_id", "Официант"),
+    ("order_time", "Время"),
+    ("total_amount", "Сумма"),
+    ("status", "Статус"),
+    ("booking_id", "Бронирование"),
+]
+
+FREE_TABLES_SQL = text(
+    """
+    SELECT *
+    FROM free_tables(
+        CAST(:d AS date),
+        CAST(:s AS time),
+        CAST(:e AS time),
+        CAST(:g AS int)
+    )
+    """
+)
+
+FREE_TABLES_COLUMNS = [
+    ("id", "Идентификатор"),
+    ("table_number", "Номер стола"),
+    ("seats", "Мест"),
+    ("status", "Статус"),
+]
+
+# Итоги поддерживаются триггером на orders (sql/14_guest_totals.sql);
+# топ по сумме читается по частичному индексу guests (total_spent DESC, id)
+GUEST_STATISTICS_SQL = text("""
+    SELECT
+      id AS guest_id,
+      concat_ws(' ', last_name, first_name, middle_name) AS full_name,
+      total_orders,
+      total_spent AS total_revenue,
+      ROUND(total_spent / total_orders, 2) AS avg_check,
+      last_visit
+    FROM guests
+    WHERE total_orders > 0
+    ORDER BY total_spent DESC, id
+    LIMIT :limit
+""")
+
+GUEST_STATISTICS_COLUMNS = [
+    ("guest_id", "Гость (идентификатор)"),
+    ("full_name", "Гость"),
+    ("total_orders", "Заказов"),
+    ("total_revenue", "Выручка"),
+    ("avg_check", "Средний чек"),
+    ("last_visit", "Последний визит"),
+]
+
+# Читает dish_sales_daily (sql/07_dish_sales_daily.sql): выручка по цене
+# на момент заказа, поиск по названию/категории — по триграммным индексам.
+SINGLE_DISH_SALES_SQL = text(
+    """
+    SELECT
+      d.name AS dish_name,
+      SUM(s.quantity) AS total_sold,
+      SUM(s.revenue) AS total_revenue,
+      SUM(s.lines) AS orders_count
+    FROM dishes d
+    JOIN dish_sales_daily s ON s.dish_id = d.id
+    WHERE d.name ILIKE '%' || :dish_name || '%'
+    GROUP BY d.name
+    ORDER BY total_revenue DESC
+    """
+)
+
+SINGLE_DISH_SALES_COLUMNS = [
+    ("dish_name", "Блюдо"),
+    ("total_sold", "Продано (шт.)"),
+    ("total_revenue", "Выручка"),
+    ("orders_count", "Кол-во заказов"),
+]
+
+# Один заказ с несколькими блюдами категории считается по разу на блюдо,
+# поэтому здесь это число позиций, а не уникальных заказов.
+CATEGORY_SALES_SQL = text(
+    """
+    SELECT
+      d.category,
+      SUM(s.quantity) AS total_sold,
+      SUM(s.revenue) AS total_revenue,
+      SUM(s.lines) AS lines_count
+    FROM dishes d
+    JOIN dish_sales_daily s ON s.dish_id = d.id
+    WHERE d.category ILIKE '%' || :category || '%'
+    GROUP BY d.category
+    ORDER BY total_revenue DESC
+    """
+)
+
+CATEGORY_SALES_COLUMNS = [
+    ("category", "Категория"),
+    ("total_sold", "Продано (шт.)"),
+    ("total_revenue", "Выручка"),
+    ("lines_count", "Позиций в заказах"),
+]
+
+DISHES_BY_CATEGORY_SQL = text("""
+    SELECT id, name, category, total_sold, total_revenue
+    FROM mv_dishes_by_category
+    WHERE category ILIKE '%' || :category || '%'
+    ORDER BY id
+""")
+
+DISHES_BY_CATEGORY_COLUMNS = [
+    ("id", "ID"),
+    ("name", "Блюдо"),
+    ("category", "Категория"),
+    ("total_sold", "Продано (шт.)"),
+    ("total_revenue", "Выручка"),
+]
+
+CONSUME_PRODUCTS_COLUMNS = [("result", "Результат")]
+
+# Пакетное списание (см. sql/06_product_writeoffs.sql, sql/19_product_writeoffs_fix.sql):
+# отменённые и уже списанные заказы пропускаются, остаток не уходит в минус —
+# недостающее количество возвращается в shortage
+CONSUME_BATCH_SQL = text("""
+    SELECT product_id, product_name, consumed, remaining, shortage, orders_count
+    FROM consume_products_batch(
+        CASE
+          WHEN NULLIF(:d1, '') IS NULL THEN CAST(:ids AS int[])
+          ELSE ARRAY(
+            SELECT id FROM orders
+            WHERE order_time >= CAST(:d1 AS date)
+              AND order_time < CAST(:d2 AS date) + 1
+          )
+        END
+    )
+""")
+
+CONSUME_BATCH_COLUMNS = [
+    ("product_id", "Продукт (идентификатор)"),
+    ("product_name", "Продукт"),
+    ("consumed", "Списано"),
+    ("remaining", "Остаток"),
+    ("shortage", "Не хватило"),
+]
+
+
+# Фоновые задачи: долгие отчёты и списание по большим заказам
+
+def _run_dishes_sales(db: Session, params: dict):
+    rows = db.execute(DISHES_SALES_SQL).mappings().all()
+    return rows
+
+
+def _run_guest_statistics(db: Session, params: dict):
+    rows = db.execute(GUEST_STATISTICS_SQL, {"limit": int(params.get("limit", 10))}).mappings().all()
+    return rows
+
+
+def _consume_order(db: Session, order_id: int):
+    # Отмечаем заказ как списанный; повторное списание не выполняется
+    claimed = db.execute(
+        text("""
+            INSERT INTO product_writeoffs (order_id)
+            VALUES (:order_id)
+            ON CONFLICT (order_id) DO NOTHING
+            RETURNING order_id
+        """),
+        {"order_id": order_id},
+    ).first()
+    if claimed is None:
+        return [{"result": f"Продукты по заказу №{order_id} уже списаны."}]
+
+    row = db.execute(
+        text("SELECT consume_products(:order_id) AS result"),
+        {"order_id": order_id},
+    ).mappings().first()
+    return [row] if row else [{"result": "Операция выполнена."}]
+
+
+def _consume_batch(db: Session, params: dict):
+    return db.execute(
+        CONSUME_BATCH_SQL,
+        {"ids": params.get("ids") or [], "d1": params.get("d1", ""), "d2": params.get("d2", "")},
+    ).mappings().all()
+
+
+def _run_consume_products(db: Session, params: dict):
+    rows = _consume_order(db, int(params["order_id"]))
+    db.commit()
+    report_cache.invalidate("products")
+    return rows
+
+
+def _run_consume_batch(db: Session, params: dict):
+    rows = _consume_batch(db, params)
+    db.commit()
+    report_cache.invalidate("products")
+    return rows
+
+
+def _run_merge_guests(db: Session, params: dict):
+    rows = merge_duplicate_guests(db)
+    db.commit()
+    report_cache.invalidate("guests", "orders")
+    return rows
+
+
+register_job("dishes_sales", "Продажи блюд", DISHES_SALES_COLUMNS, _run_dishes_sales)
+register_job("guest_statistics", "Статистика гостей", GUEST_STATISTICS_COLUMNS, _run_guest_statistics)
+register_job("consume_products", "Списание продуктов по заказу", CONSUME_PRODUCTS_COLUMNS, _run_consume_products)
+register_job("consume_batch", "Пакетное списание продуктов", CONSUME_BATCH_COLUMNS, _run_consume_batch)
+register_job("merge_guests", "Объединение дубликатов гостей", MERGE_GUESTS_COLUMNS, _run_merge_guests)
+
+
+# Панель отчётов: каждый отчёт — на своём соединении из пула, параллельно
+
+def _revenue_params():
+    today = date.today()
+    return {"d1": (today - timedelta(days=30)).isoformat(), "d2": today.isoformat()}
+
+
+def _free_tables_params():
+    now = datetime.now()
+    return {
+        "d": now.date().isoformat(),
+        "s": now.strftime("%H:%M"),
+        "e": min(now + timedelta(hours=2), now.replace(hour=23, minute=59)).strftime("%H:%M"),
+        "g": 2,
+    }
+
+
+DASHBOARD_PANELS = {
+    "revenue": {
+        "title": "Выручка за 30 дней",
+        "sql": REVENUE_SQL,
+        "columns": REVENUE_COLUMNS,
+        "params": _revenue_params,
+    },
+    "dishes_sales": {
+        "title": "Продажи блюд",
+        "sql": DISHES_SALES_SQL,
+        "columns": DISHES_SALES_COLUMNS,
+        "params": dict,
+    },
+    "guest_statistics": {
+        "title": "Статистика гостей (топ-10)",
+        "sql": GUEST_STATISTICS_SQL,
+        "columns": GUEST_STATISTICS_COLUMNS,
+        "params": lambda: {"limit": 10},
+    },
+    "free_tables": {
+        "title": "Свободные столы на ближайшие 2 часа",
+        "sql": FREE_TABLES_SQL,
+        "columns": FREE_TABLES_COLUMNS,
+        "params": _free_tables_params,
+    },
+    "stock_alerts": {
+        "title": "Склад: ниже порога и истекает за 7 дней",
+        "sql": STOCK_ALERTS_SQL,
+        "columns": STOCK_ALERTS_COLUMNS,
+        "params": lambda: {"days": stock_alert_days(7)},
+    },
+}
+
+_dashboard_pool = ThreadPoolExecutor(max_workers=2 * len(DASHBOARD_PANELS), thread_name_prefix="dashboard")
+
+
+def _run_panel(name: str):
+    panel = DASHBOARD_PANELS[name]
+    db = SessionLocal()
+    try:
+        # statement_timeout снимает запрос и в БД, а не только перестаёт его ждать
+        db.execute(
+            text("SELECT set_config('statement_timeout', :ms, true)"),
+            {"ms": str(settings.DASHBOARD_TIMEOUT_MS)},
+        )
+        rows = db.execute(panel["sql"], panel["params"]()).mappings().all()
+        db.commit()
+        return rows
+    finally:
+        db.close()
+
+
+def _job_redirect(db: Session, user: dict, kind: str, params: dict):
+    job_id = submit_job(db, kind, params, user.get("id"))
+    return RedirectResponse(url=f"/отчёты/задачи/{job_id}", status_code=303)
+
+
+def _get_user_job(db: Session, user: dict, job_id: int):
+    job = get_job(db, job_id)
+    if job is None or (user.get("role") != "admin" and job["created_by"] != user.get("id")):
+        raise HTTPException(status_code=404, detail="Задача не найдена.")
+    return job
+
+
 @router.get("", response_class=HTMLResponse)
-def reports_index(request: Request):
+def reports_index(request: Request, db: Session = Depends(get_db)):
     user = require_login(request)
+    as_of = db.execute(
+        text("SELECT MIN(refreshed_at) FROM report_refresh_log WHERE view_name = ANY(:names)"),
+        {"names": list(MATVIEWS)},
+    ).scalar()
     return templates.TemplateResponse(
         "reports/index.html",
-        {"request": request, "user": user, "title": "Отчёты"},
+        {
+            "request": request,
+            "user": user,
+            "title": "Отчёты",
+            "as_of": as_of,
+            "stock_horizon": settings.STOCK_EXPIRY_HORIZON_DAYS,
+        },
+    )
+
+
+@router.post("/обновить-витрины")
+def reports_refresh(request: Request, db: Session = Depends(get_db)):
+    require_admin(request)
+    refresh_matviews(db)
+    return RedirectResponse(url="/отчёты", status_code=303)
+
+
+@router.get("/панель", response_class=HTMLResponse)
+def reports_dashboard(request: Request):
+    user = require_login(request)
+
+    names = [n for n in settings.DASHBOARD_REPORTS if n in DASHBOARD_PANELS]
+    futures = {name: _dashboard_pool.submit(_run_panel, name) for name in names}
+    # ждём не дольше самого медленного отчёта (с небольшим запасом на соединение)
+    wait(futures.values(), timeout=settings.DASHBOARD_TIMEOUT_MS / 1000 + 1)
+
+    panels = []
+    for name in names:
+        panel = DASHBOARD_PANELS[name]
+        future = futures[name]
+        item = {"title": panel["title"], "columns": panel["columns"], "rows": [], "error": None}
+        if not future.done():
+            item["error"] = "Отчёт не успел выполниться."
+        elif future.exception() is not None:
+            exc = future.exception()
+            item["error"] = str(getattr(exc, "orig", None) or exc)
+        else:
+            item["rows"] = future.result()
+        panels.append(item)
+
+    return templates.TemplateResponse(
+        "reports/dashboard.html",
+        {"request": request, "user": user, "title": "Панель отчётов", "panels": panels},
+    )
+
+
+@router.get("/задачи", response_class=HTMLResponse)
+def jobs_list(request: Request, db: Session = Depends(get_db)):
+    user = require_login(request)
+    rows = db.execute(
+        text("""
+            SELECT id, kind, status, created_at, started_at, finished_at
+            FROM report_jobs
+            WHERE (:all_users OR created_by = :uid)
+              AND (expires_at IS NULL OR expires_at > now())
+            ORDER BY id DESC
+            LIMIT 50
+        """),
+        {"all_users": user.get("role") == "admin", "uid": user.get("id")},
+    ).mappings().all()
+
+    return templates.TemplateResponse(
+        "reports/jobs.html",
+        {
+            "request": request,
+            "user": user,
+            "title": "Фоновые отчёты",
+            "rows": rows,
+            "kinds": JOB_KINDS,
+            "statuses": JOB_STATUS_TITLES,
+        },
+    )
+
+
+@router.get("/задачи/{job_id}", response_class=HTMLResponse)
+def job_page(job_id: int, request: Request, db: Session = Depends(get_db)):
+    user = require_login(request)
+    job = _get_user_job(db, user, job_id)
+    kind = JOB_KINDS.get(job["kind"], {})
+
+    return templates.TemplateResponse(
+        "reports/job.html",
+        {
+            "request": request,
+            "user": user,
+            "title": kind.get("title", "Фоновый отчёт"),
+            "job": job,
+            "columns": kind.get("columns", []),
+            "statuses": JOB_STATUS_TITLES,
+        },
     )
 
 
+@router.get("/задачи/{job_id}/статус", response_class=HTMLResponse)
+def job_status(job_id: int, request: Request, db: Session = Depends(get_db)):
+    user = require_login(request)
+    job = _get_user_job(db, user, job_id)
+    kind = JOB_KINDS.get(job["kind"], {})
+
+    return templates.TemplateResponse(
+        "reports/_job_status.html",
+        {
+            "request": request,
+            "job": job,
+            "columns": kind.get("columns", []),
+            "statuses": JOB_STATUS_TITLES,
+        },
+    )
+
+
+@router.get("/задачи/{job_id}/csv")
+def job_download(job_id: int, request: Request, db: Session = Depends(get_db)):
+    user = require_login(request)
+    job = _get_user_job(db, user, job_id)
+    if job["status"] != "done":
+        raise HTTPException(status_code=409, detail="Задача ещё не завершена.")
+
+    kind = JOB_KINDS.get(job["kind"], {})
+    return rows_csv_response(job["rows"] or [], kind.get("columns", []), f"{kind.get('title', 'отчёт')}_{job_id}")
+
+
 @router.post("/выручка", response_class=HTMLResponse)
 def report_revenue(
     request: Request,
     db: Session = Depends(get_db),
     date_from: str = Form(...),
     date_to: str = Form(...),
+    export: str = Form(""),
 ):
     user = require_login(request)
-    value = db.execute(
-        text("SELECT get_revenue(CAST(:d1 AS date), CAST(:d2 AS date)) AS revenue"),
-        {"d1": date_from, "d2": date_to},
-    ).mappings().first()
+    params = {"d1": date_from, "d2": date_to}
+
+    if export:
+        return export_response(REVENUE_SQL, params, REVENUE_COLUMNS, f"выручка_{date_from}_{date_to}", export)
+
+    rows = db.execute(REVENUE_SQL, params).mappings().all()
+
+    orders_count = sum(r["orders_count"] for r in rows)
+    revenue = sum(r["revenue"] for r in rows)
+    total = {
+        "day": "Итого",
+        "orders_count": orders_count,
+        "revenue": revenue,
+        "avg_check": round(revenue / orders_count, 2) if orders_count else 0,
+    }
 
     return templates.TemplateResponse(
         "reports/result_table.html",
@@ -42,17 +552,180 @@ def report_revenue(
             "request": request,
             "user": user,
             "title": "Выручка за период",
-            "columns": [("revenue", "Выручка")],
-            "rows": [value] if value else [{"revenue": 0}],
+            "columns": REVENUE_COLUMNS,
+            "rows": [*rows, total],
+            "back_url": "/отчёты",
+        },
+    )
+
+
+@router.post("/официанты", response_class=HTMLResponse)
+def report_waiters(
+    request: Request,
+    db: Session = Depends(get_db),
+    date_from: str = Form(...),
+    date_to: str = Form(...),
+    export: str = Form(""),
+):
+    user = require_login(request)
+    params = {"d1": date_from, "d2": date_to}
+
+    if export:
+        return export_response(WAITERS_SQL, params, WAITERS_COLUMNS, f"официанты_{date_from}_{date_to}", export)
+
+    rows = db.execute(WAITERS_SQL, params).mappings().all()
+
+    return templates.TemplateResponse(
+        "reports/result_table.html",
+        {
+            "request": request,
+            "user": user,
+            "title": "Работа официантов за период",
+            "columns": WAITERS_COLUMNS,
+            "rows": rows,
+            "back_url": "/отчёты",
+        },
+    )
+
+
+@router.get("/склад", response_class=HTMLResponse)
+def report_stock(
+    request: Request,
+    db: Session = Depends(get_db),
+    days: int = Query(7, ge=0),
+    export: str = Query(""),
+):
+    user = require_login(request)
+    days = stock_alert_days(days)
+
+    if export:
+        return export_response(STOCK_ALERTS_SQL, {"days": days}, STOCK_ALERTS_COLUMNS, f"склад_{days}", export)
+
+    rows, cached_at = stock_alerts(db, days)
+
+    return templates.TemplateResponse(
+        "reports/result_table.html",
+        {
+            "request": request,
+            "user": user,
+            "title": f"Склад: ниже порога дозаказа и истекает срок за {days} дн.",
+            "cached_at": cached_at,
+            "columns": STOCK_ALERTS_COLUMNS,
+            "rows": rows,
+            "back_url": "/отчёты",
+        },
+    )
+
+
+@router.post("/нагрузка", response_class=HTMLResponse)
+def report_heatmap(
+    request: Request,
+    db: Session = Depends(get_db),
+    date_to: str = Form(""),
+    weeks: int = Form(12),
+    window: int = Form(4),
+    metric: str = Form("amount"),
+    dish_name: str = Form(""),
+    export: str = Form(""),
+):
+    user = require_login(request)
+    if metric not in HEATMAP_METRICS:
+        raise HTTPException(status_code=400, detail="Неизвестный показатель.")
+    try:
+        d2 = date.fromisoformat(date_to) if date_to else date.today()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Неверная дата.")
+
+    dish_name = dish_name.strip()
+    result = heatmap(db, d2, weeks, window, dish_name)
+    rows = heatmap_rows(result, metric)
+
+    if export:
+        return rows_csv_response(rows, HEATMAP_COLUMNS, f"нагрузка_{metric}_{d2.isoformat()}")
+
+    message = (
+        f"Период {result['date_from']:%d.%m.%Y} — {result['date_to']:%d.%m.%Y}, недель: {result['weeks']}."
+    )
+    if metric == "rolling":
+        message += f" Среднее за последние {result['window']} нед."
+
+    return templates.TemplateResponse(
+        "reports/result_table.html",
+        {
+            "request": request,
+            "user": user,
+            "title": f"Нагрузка по дням недели и часам: {HEATMAP_METRICS[metric].lower()}"
+            + (f" (блюдо «{dish_name}»)" if dish_name else ""),
+            "message": message,
+            "columns": HEATMAP_COLUMNS,
+            "rows": rows,
+            "back_url": "/отчёты",
+        },
+    )
+
+
+@router.post("/прогноз", response_class=HTMLResponse)
+def report_forecast(
+    request: Request,
+    db: Session = Depends(get_db),
+    date_from: str = Form(""),
+    weeks: int = Form(8),
+    alpha: float = Form(0.5),
+    view: str = Form("dishes"),
+    export: str = Form(""),
+):
+    user = require_login(request)
+    try:
+        start = date.fromisoformat(date_from) if date_from else date.today()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Неверная дата.")
+
+    result = demand_forecast(db, start, weeks, alpha)
+    if view == "products":
+        title = "Прогноз расхода продуктов на неделю"
+        columns = FORECAST_PRODUCT_COLUMNS
+        rows = forecast_product_rows(result)
+    else:
+        title = "Прогноз продаж блюд на неделю"
+        columns = forecast_dish_columns(result)
+        rows = forecast_dish_rows(result)
+
+    if export:
+        slug = "прогноз_продуктов" if view == "products" else "прогноз_блюд"
+        return rows_csv_response(rows, columns, f"{slug}_{start.isoformat()}")
+
+    return templates.TemplateResponse(
+        "reports/result_table.html",
+        {
+            "request": request,
+            "user": user,
+            "title": title,
+            "message": (
+                f"Неделя с {start:%d.%m.%Y}. История: {result['weeks']} нед., "
+                f"коэффициент сглаживания {result['alpha']:g}."
+            ),
+            "columns": columns,
+            "rows": rows,
             "back_url": "/отчёты",
         },
     )
 
 
 @router.post("/продажи-блюд", response_class=HTMLResponse)
-def report_dishes_sales(request: Request, db: Session = Depends(get_db)):
+def report_dishes_sales(
+    request: Request,
+    db: Session = Depends(get_db),
+    export: str = Form(""),
+    background: str = Form(""),
+):
     user = require_login(request)
-    rows = db.execute(text("SELECT * FROM dishes_sales()")).mappings().all()
+
+    if background:
+        return _job_redirect(db, user, "dishes_sales", {})
+    if export:
+        return export_response(DISHES_SALES_SQL, {}, DISHES_SALES_COLUMNS, "продажи_блюд", export)
+
+    rows = db.execute(DISHES_SALES_SQL).mappings().all()
 
     return templates.TemplateResponse(
         "reports/result_table.html",
@@ -60,12 +733,8 @@ def report_dishes_sales(request: Request, db: Session = Depends(get_db)):
             "request": request,
             "user": user,
             "title": "Продажи блюд",
-            "columns": [
-                ("dish_name", "Блюдо"),
-                ("total_sold", "Продано (шт.)"),
-                ("total_revenue", "Выручка"),
-                ("avg_price", "Средняя сумма позиции"),
-            ],
+            "as_of": refreshed_at(db, "mv_dishes_sales"),
+            "columns": DISHES_SALES_COLUMNS,
             "rows": rows,
             "back_url": "/отчёты",
         },
@@ -77,24 +746,15 @@ def report_guest_orders(
     request: Request,
     db: Session = Depends(get_db),
     guest_id: int = Form(...),
+    export: str = Form(""),
 ):
     user = require_login(request)
+    params = {"guest_id": guest_id}
 
-    rows = db.execute(
-        text("SELECT * FROM guest_orders(:guest_id)"),
-        {"guest_id": guest_id},
-    ).mappings().all()
+    if export:
+        return export_response(GUEST_ORDERS_SQL, params, GUEST_ORDERS_COLUMNS, f"заказы_гостя_{guest_id}", export)
 
-    columns = [
-        ("id", "Номер заказа"),
-        ("guest_id", "Гость"),
-        ("table_id", "Стол"),
-        ("waiter_id", "Официант"),
-        ("order_time", "Время"),
-        ("total_amount", "Сумма"),
-        ("status", "Статус"),
-        ("booking_id", "Бронирование"),
-    ]
+    rows = db.execute(GUEST_ORDERS_SQL, params).mappings().all()
 
     return templates.TemplateResponse(
         "reports/result_table.html",
@@ -102,13 +762,23 @@ def report_guest_orders(
             "request": request,
             "user": user,
             "title": "Заказы гостя",
-            "columns": columns,
+            "columns": GUEST_ORDERS_COLUMNS,
             "rows": rows,
             "back_url": "/отчёты",
         },
     )
 
 
+def _free_tables_params_from_form(d: str, start: str, end: str, guests: int):
+    # Разбор полей формы: неверная дата или время -> 400, а не ошибка в индексе или в БД
+    try:
+        parsed = (date.fromisoformat(d.strip()), time.fromisoformat(start.strip()), time.fromisoformat(end.strip()))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Неверная дата или время.")
+    params = {"d": parsed[0].isoformat(), "s": parsed[1].isoformat(), "e": parsed[2].isoformat(), "g": guests}
+    return parsed, params
+
+
 @router.post("/свободные-столы", response_class=HTMLResponse)
 def report_free_tables(
     request: Request,
@@ -117,30 +787,18 @@ def report_free_tables(
     start: str = Form(...),
     end: str = Form(...),
     guests: int = Form(...),
+    export: str = Form(""),
 ):
     user = require_login(request)
+    (d, s, e), params = _free_tables_params_from_form(date, start, end, guests)
 
-    rows = db.execute(
-        text(
-            """
-            SELECT * 
-            FROM free_tables(
-                CAST(:d AS date),
-                CAST(:s AS time),
-                CAST(:e AS time),
-                CAST(:g AS int)
-            )
-            """
-        ),
-        {"d": date, "s": start, "e": end, "g": guests},
-    ).mappings().all()
+    if export:
+        return export_response(FREE_TABLES_SQL, params, FREE_TABLES_COLUMNS, f"свободные_столы_{params['d']}", export)
 
-    columns = [
-        ("id", "Идентификатор"),
-        ("table_number", "Номер стола"),
-        ("seats", "Мест"),
-        ("status", "Статус"),
-    ]
+    # Индекс в памяти; даты, которых в нём нет, — через free_tables()
+    rows = availability.lookup(d, s, e, guests)
+    if rows is None:
+        rows = db.execute(FREE_TABLES_SQL, params).mappings().all()
 
     return templates.TemplateResponse(
         "reports/result_table.html",
@@ -148,7 +806,58 @@ def report_free_tables(
             "request": request,
             "user": user,
             "title": "Свободные столы",
-            "columns": columns,
+            "columns": FREE_TABLES_COLUMNS,
+            "rows": rows,
+            "back_url": "/отчёты",
+        },
+    )
+
+
+@router.post("/свободные-столы/сверка", response_class=HTMLResponse)
+def report_free_tables_check(
+    request: Request,
+    db: Session = Depends(get_db),
+    date: str = Form(...),
+    start: str = Form(...),
+    end: str = Form(...),
+    guests: int = Form(...),
+):
+    user = require_login(request)
+    (d, s, e), params = _free_tables_params_from_form(date, start, end, guests)
+
+    # Сверка индекса в памяти с функцией free_tables()
+    from_sql = {r["id"]: r for r in db.execute(FREE_TABLES_SQL, params).mappings()}
+    from_index = availability.lookup(d, s, e, guests)
+
+    if from_index is None:
+        message = "Индекс не загружен или не покрывает эту дату."
+        rows = []
+    else:
+        from_index = {r["id"]: r for r in from_index}
+        rows = [
+            {
+                "id": table_id,
+                "table_number": (from_sql.get(table_id) or from_index.get(table_id))["table_number"],
+                "in_index": "да" if table_id in from_index else "нет",
+                "in_sql": "да" if table_id in from_sql else "нет",
+            }
+            for table_id in sorted(from_sql.keys() ^ from_index.keys())
+        ]
+        message = "Расхождений нет." if not rows else f"Расхождений: {len(rows)}."
+
+    return templates.TemplateResponse(
+        "reports/result_table.html",
+        {
+            "request": request,
+            "user": user,
+            "title": "Свободные столы: сверка индекса с БД",
+            "message": message,
+            "columns": [
+                ("id", "Идентификатор"),
+                ("table_number", "Номер стола"),
+                ("in_index", "В индексе"),
+                ("in_sql", "В free_tables()"),
+            ],
             "rows": rows,
             "back_url": "/отчёты",
         },
@@ -160,21 +869,19 @@ def report_guest_statistics(
     request: Request,
     db: Session = Depends(get_db),
     limit: int = Form(10),
+    export: str = Form(""),
+    background: str = Form(""),
 ):
     user = require_login(request)
+    params = {"limit": limit}
 
-    rows = db.execute(
-        text("SELECT * FROM guest_statistics(:limit)"),
-        {"limit": limit},
-    ).mappings().all()
+    if background:
+        return _job_redirect(db, user, "guest_statistics", params)
 
-    columns = [
-        ("guest_id", "Гость (идентификатор)"),
-        ("full_name", "Гость"),
-        ("total_orders", "Заказов"),
-        ("total_revenue", "Выручка"),
-        ("avg_check", "Средний чек"),
-    ]
+    if export:
+        return export_response(GUEST_STATISTICS_SQL, params, GUEST_STATISTICS_COLUMNS, "статистика_гостей", export)
+
+    rows = db.execute(GUEST_STATISTICS_SQL, params).mappings().all()
 
     return templates.TemplateResponse(
         "reports/result_table.html",
@@ -182,7 +889,7 @@ def report_guest_statistics(
             "request": request,
             "user": user,
             "title": "Статистика гостей",
-            "columns": columns,
+            "columns": GUEST_STATISTICS_COLUMNS,
             "rows": rows,
             "back_url": "/отчёты",
         },
@@ -194,17 +901,16 @@ def action_consume_products(
     request: Request,
     db: Session = Depends(get_db),
     order_id: int = Form(...),
+    background: str = Form(""),
 ):
     user = require_login(request)
 
-    row = db.execute(
-        text("SELECT consume_products(:order_id) AS result"),
-        {"order_id": order_id},
-    ).mappings().first()
-    db.commit()
+    if background:
+        return _job_redirect(db, user, "consume_products", {"order_id": order_id})
 
-    columns = [("result", "Результат")]
-    rows = [row] if row else [{"result": "Операция выполнена."}]
+    rows = _consume_order(db, order_id)
+    db.commit()
+    report_cache.invalidate("products")
 
     return templates.TemplateResponse(
         "reports/result_table.html",
@@ -212,7 +918,63 @@ def action_consume_products(
             "request": request,
             "user": user,
             "title": "Списание продуктов по заказу",
-            "columns": columns,
+            "columns": CONSUME_PRODUCTS_COLUMNS,
+            "rows": rows,
+            "back_url": "/отчёты",
+        },
+    )
+
+
+def _parse_order_ids(value: str):
+    try:
+        return sorted({int(part) for part in value.replace(",", " ").split()})
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Номера заказов должны быть целыми числами.")
+
+
+@router.post("/списать-продукты-пакетом", response_class=HTMLResponse)
+def action_consume_products_batch(
+    request: Request,
+    db: Session = Depends(get_db),
+    order_ids: str = Form(""),
+    date_from: str = Form(""),
+    date_to: str = Form(""),
+    background: str = Form(""),
+):
+    user = require_login(request)
+
+    ids = _parse_order_ids(order_ids)
+    d1 = date_from.strip()
+    d2 = date_to.strip() or d1
+    if not ids and not d1:
+        raise HTTPException(status_code=400, detail="Укажите номера заказов или период.")
+    if ids and d1:
+        raise HTTPException(status_code=400, detail="Укажите либо номера заказов, либо период, но не то и другое.")
+
+    params = {"ids": ids, "d1": d1, "d2": d2}
+    if background:
+        return _job_redirect(db, user, "consume_batch", params)
+
+    rows = _consume_batch(db, params)
+    db.commit()
+    report_cache.invalidate("products")
+
+    if rows:
+        message = f"Списаны продукты по заказам: {rows[0]['orders_count']}."
+        short = [r["product_name"] for r in rows if r["shortage"]]
+        if short:
+            message += " Не хватило на складе: " + ", ".join(short) + "; остаток обнулён."
+    else:
+        message = "Нечего списывать: заказы не найдены, отменены или уже списаны."
+
+    return templates.TemplateResponse(
+        "reports/result_table.html",
+        {
+            "request": request,
+            "user": user,
+            "title": "Пакетное списание продуктов",
+            "message": message,
+            "columns": CONSUME_BATCH_COLUMNS,
             "rows": rows,
             "back_url": "/отчёты",
         },
@@ -227,33 +989,20 @@ def report_single_dish_sales(
     request: Request,
     db: Session = Depends(get_db),
     dish_name: str = Form(...),
+    export: str = Form(""),
 ):
     user = require_login(request)
+    params = {"dish_name": dish_name.strip()}
 
-    rows = db.execute(
-        text(
-            """
-            SELECT
-              d.name AS dish_name,
-              SUM(oi.quantity) AS total_sold,
-              SUM(oi.quantity * d.price) AS total_revenue,
-              COUNT(DISTINCT oi.order_id) AS orders_count
-            FROM order_items oi
-            JOIN dishes d ON d.id = oi.dish_id
-            WHERE d.name ILIKE '%' || :dish_name || '%'
-            GROUP BY d.name
-            ORDER BY total_revenue DESC
-            """
-        ),
-        {"dish_name": dish_name.strip()},
-    ).mappings().all()
+    if export:
+        return export_response(SINGLE_DISH_SALES_SQL, params, SINGLE_DISH_SALES_COLUMNS, "продажи_блюда", export)
 
-    columns = [
-        ("dish_name", "Блюдо"),
-        ("total_sold", "Продано (шт.)"),
-        ("total_revenue", "Выручка"),
-        ("orders_count", "Кол-во заказов"),
-    ]
+    rows, cached_at = report_cache.rows(
+        "single_dish_sales",
+        params,
+        ("order_items", "orders", "dishes"),
+        lambda: db.execute(SINGLE_DISH_SALES_SQL, params).mappings().all(),
+    )
 
     return templates.TemplateResponse(
         "reports/result_table.html",
@@ -261,7 +1010,8 @@ def report_single_dish_sales(
             "request": request,
             "user": user,
             "title": f"Продажи блюда «{dish_name}»",
-            "columns": columns,
+            "cached_at": cached_at,
+            "columns": SINGLE_DISH_SALES_COLUMNS,
             "rows": rows,
             "back_url": "/отчёты",
         },
@@ -276,33 +1026,20 @@ def report_category_sales(
     request: Request,
     db: Session = Depends(get_db),
     category: str = Form(...),
+    export: str = Form(""),
 ):
     user = require_login(request)
+    params = {"category": category.strip()}
 
-    rows = db.execute(
-        text(
-            """
-            SELECT
-              d.category,
-              SUM(oi.quantity) AS total_sold,
-              SUM(oi.quantity * d.price) AS total_revenue,
-              COUNT(DISTINCT oi.order_id) AS orders_count
-            FROM order_items oi
-            JOIN dishes d ON d.id = oi.dish_id
-            WHERE d.category ILIKE '%' || :category || '%'
-            GROUP BY d.category
-            ORDER BY total_revenue DESC
-            """
-        ),
-        {"category": category.strip()},
-    ).mappings().all()
+    if export:
+        return export_response(CATEGORY_SALES_SQL, params, CATEGORY_SALES_COLUMNS, "продажи_категории", export)
 
-    columns = [
-        ("category", "Категория"),
-        ("total_sold", "Продано (шт.)"),
-        ("total_revenue", "Выручка"),
-        ("orders_count", "Кол-во заказов"),
-    ]
+    rows, cached_at = report_cache.rows(
+        "category_sales",
+        params,
+        ("order_items", "orders", "dishes"),
+        lambda: db.execute(CATEGORY_SALES_SQL, params).mappings().all(),
+    )
 
     return templates.TemplateResponse(
         "reports/result_table.html",
@@ -310,7 +1047,8 @@ def report_category_sales(
             "request": request,
             "user": user,
             "title": f"Продажи по категории «{category}»",
-            "columns": columns,
+            "cached_at": cached_at,
+            "columns": CATEGORY_SALES_COLUMNS,
             "rows": rows,
             "back_url": "/отчёты",
         },
@@ -321,21 +1059,20 @@ def report_dishes_by_category(
     request: Request,
     db: Session = Depends(get_db),
     category: str = Form(...),
+    export: str = Form(""),
 ):
     user = require_login(request)
+    params = {"category": category.strip()}
 
-    rows = db.execute(
-        text("SELECT * FROM dishes_by_category(:category)"),
-        {"category": category.strip()},
-    ).mappings().all()
+    if export:
+        return export_response(DISHES_BY_CATEGORY_SQL, params, DISHES_BY_CATEGORY_COLUMNS, "блюда_категории", export)
 
-    columns = [
-        ("id", "ID"),
-        ("name", "Блюдо"),
-        ("category", "Категория"),
-        ("total_sold", "Продано (шт.)"),
-        ("total_revenue", "Выручка"),
-    ]
+    rows, cached_at = report_cache.rows(
+        "dishes_by_category",
+        params,
+        ("mv_dishes_by_category",),
+        lambda: db.execute(DISHES_BY_CATEGORY_SQL, params).mappings().all(),
+    )
 
     return templates.TemplateResponse(
         "reports/result_table.html",
@@ -343,9 +1080,38 @@ def report_dishes_by_category(
             "request": request,
             "user": user,
             "title": f"Блюда категории «{category}»",
-            "columns": columns,
+            "cached_at": cached_at,
+            "as_of": refreshed_at(db, "mv_dishes_by_category"),
+            "columns": DISHES_BY_CATEGORY_COLUMNS,
             "rows": rows,
             "back_url": "/отчёты",
         },
     )
 
+
+@router.post("/объединить-гостей", response_class=HTMLResponse)
+def action_merge_guests(
+    request: Request,
+    db: Session = Depends(get_db),
+    background: str = Form(""),
+):
+    user = require_admin(request)
+
+    if background:
+        return _job_redirect(db, user, "merge_guests", {})
+
+    rows = merge_duplicate_guests(db)
+    db.commit()
+    report_cache.invalidate("guests", "orders")
+
+    return templates.TemplateResponse(
+        "reports/result_table.html",
+        {
+            "request": request,
+            "user": user,
+            "title": "Объединение дубликатов гостей",
+            "columns": MERGE_GUESTS_COLUMNS,
+            "rows": rows,
+            "back_url": "/отчёты",
+        },
+    )
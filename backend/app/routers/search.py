@@ -1,11 +1,15 @@
+import secrets
+import threading
 from pathlib import Path
 
-from fastapi import APIRouter, Depends, Form, Request
-from fastapi.responses import HTMLResponse
+from fastapi import APIRouter, Depends, Form, Query, Request
+from fastapi.responses import HTMLResponse, Response
 from fastapi.templating import Jinja2Templates
 from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
 from sqlalchemy.orm import Session
 
+from ..config import settings
 from ..db import get_db
 from ..deps import require_login
 
@@ -15,13 +19,90 @@ router = APIRouter(prefix="/поиск", tags=["Поиск"])
 BASE_DIR = Path(__file__).resolve().parents[1]
 templates = Jinja2Templates(directory=str(BASE_DIR / "templates"))
 
+SEARCH_SQL = text(
+    """
+    SELECT
+      o.id AS order_id,
+      o.order_time,
+      o.status,
+      o.total_amount,
+      g.last_name || ' ' || g.first_name AS guest_name,
+      t.table_number,
+      w.last_name || ' ' || w.first_name AS waiter_name,
+      COALESCE(SUM(p.amount), 0) AS paid_amount
+    FROM orders o
+    LEFT JOIN guests g ON g.id = o.guest_id
+    LEFT JOIN tables t ON t.id = o.table_id
+    LEFT JOIN waiters w ON w.id = o.waiter_id
+    LEFT JOIN payments p ON p.order_id = o.id
+    WHERE (:ln = '' OR g.last_name ILIKE :ln_like)
+      AND (:st = '' OR o.status = :st)
+      AND (NULLIF(:d1, '') IS NULL OR o.order_time::date >= CAST(NULLIF(:d1, '') AS date))
+      AND (NULLIF(:d2, '') IS NULL OR o.order_time::date <= CAST(NULLIF(:d2, '') AS date))
+    GROUP BY
+      o.id, o.order_time, o.status, o.total_amount,
+      g.last_name, g.first_name,
+      t.table_number,
+      w.last_name, w.first_name
+    ORDER BY o.order_time DESC
+    LIMIT 200
+    """
+)
+
+# SQLSTATE query_canceled: и отмена, и statement_timeout
+QUERY_CANCELED = "57014"
+
+# Незавершённые запросы живого поиска: ключ клиента -> DBAPI-соединение
+_inflight: dict = {}
+_inflight_lock = threading.Lock()
+
+
+def _search_params(guest_last_name: str, status: str, date_from: str, date_to: str) -> dict:
+    ln = (guest_last_name or "").strip()
+    return {
+        "ln": ln,
+        "ln_like": f"%{ln}%",
+        "st": (status or "").strip(),
+        "d1": (date_from or "").strip(),  # ожидается YYYY-MM-DD или пусто
+        "d2": (date_to or "").strip(),    # ожидается YYYY-MM-DD или пусто
+    }
+
+
+def _client_key(request: Request, user: dict) -> str:
+    # одна вкладка = один клиент; без токена вкладки — один на пользователя
+    tab = request.query_params.get("tab", "")
+    return f"{user['id']}:{tab}"
+
+
+def _register(key: str, raw_conn):
+    # Отменяем предыдущий запрос этого клиента, пока он ещё числится за ним:
+    # после выхода из запроса соединение снимается с учёта под той же блокировкой,
+    # поэтому отмена не может попасть в чужой запрос из пула.
+    with _inflight_lock:
+        prev = _inflight.get(key)
+        _inflight[key] = raw_conn
+        if prev is not None and prev is not raw_conn:
+            try:
+                prev.cancel()
+            except Exception:
+                pass
+
+
+def _unregister(key: str, raw_conn) -> bool:
+    # True, если запрос всё ещё актуален (его не вытеснил более новый)
+    with _inflight_lock:
+        if _inflight.get(key) is raw_conn:
+            del _inflight[key]
+            return True
+        return False
+
 
 @router.get("", response_class=HTMLResponse)
 def search_form(request: Request):
     user = require_login(request)
     return templates.TemplateResponse(
         "search/index.html",
-        {"request": request, "user": user, "title": "Поиск"},
+        {"request": request, "user": user, "title": "Поиск", "tab": secrets.token_hex(8)},
     )
 
 
@@ -36,48 +117,9 @@ def search_results(
 ):
     user = require_login(request)
 
-    ln = (guest_last_name or "").strip()
-    st = (status or "").strip()
-    d1 = (date_from or "").strip()  # ожидается YYYY-MM-DD или пусто
-    d2 = (date_to or "").strip()    # ожидается YYYY-MM-DD или пусто
-
     rows = db.execute(
-        text(
-            """
-            SELECT
-              o.id AS order_id,
-              o.order_time,
-              o.status,
-              o.total_amount,
-              g.last_name || ' ' || g.first_name AS guest_name,
-              t.table_number,
-              w.last_name || ' ' || w.first_name AS waiter_name,
-              COALESCE(SUM(p.amount), 0) AS paid_amount
-            FROM orders o
-            LEFT JOIN guests g ON g.id = o.guest_id
-            LEFT JOIN tables t ON t.id = o.table_id
-            LEFT JOIN waiters w ON w.id = o.waiter_id
-            LEFT JOIN payments p ON p.order_id = o.id
-            WHERE (:ln = '' OR g.last_name ILIKE :ln_like)
-              AND (:st = '' OR o.status = :st)
-              AND (NULLIF(:d1, '') IS NULL OR o.order_time::date >= CAST(NULLIF(:d1, '') AS date))
-              AND (NULLIF(:d2, '') IS NULL OR o.order_time::date <= CAST(NULLIF(:d2, '') AS date))
-            GROUP BY
-              o.id, o.order_time, o.status, o.total_amount,
-              g.last_name, g.first_name,
-              t.table_number,
-              w.last_name, w.first_name
-            ORDER BY o.order_time DESC
-            LIMIT 200
-            """
-        ),
-        {
-            "ln": ln,
-            "ln_like": f"%{ln}%",
-            "st": st,
-            "d1": d1,
-            "d2": d2,
-        },
+        SEARCH_SQL,
+        _search_params(guest_last_name, status, date_from, date_to),
     ).mappings().all()
 
     return templates.TemplateResponse(
@@ -89,3 +131,52 @@ def search_results(
             "rows": rows,
         },
     )
+
+
+@router.get("/живой", response_class=HTMLResponse)
+def search_live(
+    request: Request,
+    db: Session = Depends(get_db),
+    guest_last_name: str = Query(""),
+    status: str = Query(""),
+    date_from: str = Query(""),
+    date_to: str = Query(""),
+):
+    user = require_login(request)
+    params = _search_params(guest_last_name, status, date_from, date_to)
+
+    if not any((params["ln"], params["st"], params["d1"], params["d2"])):
+        return templates.TemplateResponse(
+            "search/_rows.html",
+            {"request": request, "rows": [], "message": "Начните вводить условия поиска."},
+        )
+
+    key = _client_key(request, user)
+    raw_conn = db.connection().connection.dbapi_connection
+    _register(key, raw_conn)
+
+    error = None
+    rows = []
+    try:
+        db.execute(
+            text("SELECT set_config('statement_timeout', :ms, true)"),
+            {"ms": str(settings.SEARCH_STATEMENT_TIMEOUT_MS)},
+        )
+        rows = db.execute(SEARCH_SQL, params).mappings().all()
+    except OperationalError as exc:
+        db.rollback()
+        if getattr(exc.orig, "pgcode", None) != QUERY_CANCELED:
+            raise
+        error = "Запрос выполнялся слишком долго. Уточните условия поиска."
+    finally:
+        actual = _unregister(key, raw_conn)
+    db.commit()
+
+    if not actual:
+        # ответ уже никому не нужен: клиент отправил более новый запрос
+        return Response(status_code=204)
+
+    return templates.TemplateResponse(
+        "search/_rows.html",
+        {"request": request, "rows": rows, "error": error},
+    )
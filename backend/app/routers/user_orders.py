@@ -7,6 +7,7 @@ from fastapi.templating import Jinja2Templates
 from sqlalchemy import text
 from sqlalchemy.orm import Session
 
+from ..cache import report_cache
 from ..db import get_db
 from ..deps import get_current_user  # должен возвращать dict из session
 
@@ -82,5 +83,6 @@ def create_order_submit(
         },
     )
     db.commit()
+    report_cache.invalidate("orders")
 
     return RedirectResponse(url="/профиль", status_code=303)
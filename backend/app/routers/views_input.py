@@ -8,8 +8,10 @@ from sqlalchemy import text
 from sqlalchemy.orm import Session
 from passlib.hash import bcrypt
 
+from ..cache import report_cache
 from ..db import get_db
 from ..deps import require_admin
+from ..guests import find_or_create_guest, parse_birth_date
 
 
 router = APIRouter(prefix="/ввод-через-представление", tags=["Добавить гостя"])
@@ -45,6 +47,7 @@ def order_entry_submit(
     guest_last_name: str = Form(...),
     guest_first_name: str = Form(...),
     guest_middle_name: str = Form(""),
+    guest_birth_date: str = Form(""),
 
     # опционально аккаунт
     create_user: str = Form("0"),      # hidden=0 + checkbox value=1
@@ -79,19 +82,10 @@ def order_entry_submit(
     }
     status_ru = STATUS_MAP.get((status or "").strip().lower(), "создан")
 
-    # 1) создаём гостя
-    guest_id = db.execute(
-        text("""
-            INSERT INTO guests (last_name, first_name, middle_name, birth_date, total_orders, total_discount)
-            VALUES (:ln, :fn, NULLIF(:mn, ''), NULL, 0, 0)
-            RETURNING id
-        """),
-        {
-            "ln": guest_last_name.strip(),
-            "fn": guest_first_name.strip(),
-            "mn": guest_middle_name.strip(),
-        },
-    ).scalar_one()
+    # 1) гость: существующий с тем же ФИО и датой рождения или новый
+    guest_id = find_or_create_guest(
+        db, guest_last_name, guest_first_name, guest_middle_name, parse_birth_date(guest_birth_date)
+    )
 
     # 2) опционально создаём аккаунт (логин + ПАРОЛЬ -> bcrypt hash)
     if (create_user or "").strip() == "1":
@@ -144,4 +138,5 @@ def order_entry_submit(
     )
 
     db.commit()
+    report_cache.invalidate("orders", "guests")
     return RedirectResponse(url="/заказы", status_code=303)
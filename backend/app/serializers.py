@@ -0,0 +1,56 @@
+from datetime import date, datetime, time
+from decimal import Decimal
+
+# Колоночный формат: {"columns": [...], "types": [...], "data": [[...], ...]},
+# где data[i] — все значения i-й колонки. Строки не превращаются в словари.
+# numeric (суммы, цены) отдаётся строкой с типом "decimal": float теряет точность.
+
+_TYPES = (
+    (bool, "boolean"),
+    (int, "integer"),
+    (Decimal, "decimal"),
+    (float, "number"),
+    (datetime, "datetime"),
+    (date, "date"),
+    (time, "time"),
+)
+
+
+def _type_of(values) -> str:
+    for value in values:
+        if value is None:
+            continue
+        for py_type, name in _TYPES:
+            if isinstance(value, py_type):
+                return name
+        return "string"
+    return "null"
+
+
+def _converter(type_name: str):
+    if type_name == "number":
+        return lambda v: None if v is None else float(v)
+    if type_name == "decimal":
+        return lambda v: None if v is None else str(v)
+    if type_name in ("datetime", "date", "time"):
+        return lambda v: None if v is None else v.isoformat()
+    if type_name == "string":
+        return lambda v: None if v is None else str(v)
+    return None
+
+
+def columnar(keys, rows, columns) -> dict:
+    # keys — имена колонок результата (result.keys()), rows — кортежи строк
+    positions = {key: i for i, key in enumerate(keys)}
+    transposed = list(zip(*rows)) if rows else [() for _ in keys]
+
+    names, types, data = [], [], []
+    for key, label in columns:
+        values = transposed[positions[key]]
+        type_name = _type_of(values)
+        convert = _converter(type_name)
+        names.append({"name": key, "label": label})
+        types.append(type_name)
+        data.append(list(values) if convert is None else [convert(v) for v in values])
+
+    return {"columns": names, "types": types, "data": data}
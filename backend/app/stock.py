@@ -0,0 +1,109 @@
+import logging
+import threading
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from .cache import report_cache
+from .config import settings
+from .db import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+# Монитор склада (см. sql/12_stock_alerts.sql). Запрос читает только stock_alerts —
+# продукты ниже порога дозаказа и со сроком до границы проверки, — а не весь products.
+
+STOCK_ALERTS_SQL = text("""
+    SELECT
+      p.id AS product_id,
+      p.name AS product_name,
+      p.category,
+      p.quantity,
+      p.reorder_level,
+      p.expiry_date,
+      p.expiry_date - CURRENT_DATE AS days_left,
+      CASE
+        WHEN a.low_stock AND p.expiry_date <= CURRENT_DATE + :days THEN 'мало, истекает срок'
+        WHEN a.low_stock THEN 'ниже порога'
+        WHEN p.expiry_date < CURRENT_DATE THEN 'срок истёк'
+        ELSE 'истекает срок'
+      END AS reason
+    FROM stock_alerts a
+    JOIN products p ON p.id = a.product_id
+    WHERE a.low_stock OR p.expiry_date <= CURRENT_DATE + :days
+    ORDER BY p.expiry_date NULLS LAST, p.name
+""")
+
+STOCK_ALERTS_COLUMNS = [
+    ("product_name", "Продукт"),
+    ("category", "Категория"),
+    ("quantity", "Остаток"),
+    ("reorder_level", "Порог дозаказа"),
+    ("expiry_date", "Срок годности"),
+    ("days_left", "Дней до истечения"),
+    ("reason", "Причина"),
+]
+
+
+def stock_alert_days(days) -> int:
+    # Дальше границы проверки stock_alerts продукты не содержит
+    return max(0, min(int(days), settings.STOCK_EXPIRY_HORIZON_DAYS))
+
+
+def stock_alerts(db: Session, days: int):
+    params = {"days": stock_alert_days(days)}
+    return report_cache.rows(
+        "stock_alerts",
+        params,
+        ("products", "stock_alerts"),
+        lambda: db.execute(STOCK_ALERTS_SQL, params).mappings().all(),
+    )
+
+
+def check_stock_alerts(db: Session) -> int:
+    changed = db.execute(
+        text("SELECT stock_alerts_check(:horizon)"),
+        {"horizon": settings.STOCK_EXPIRY_HORIZON_DAYS},
+    ).scalar_one()
+    db.commit()
+    if changed:
+        report_cache.invalidate("stock_alerts")
+    return changed
+
+
+class StockMonitor:
+    # Фоновый поток: при старте и затем раз в interval секунд сдвигает границу сроков
+
+    def __init__(self, interval: int):
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self.interval <= 0 or self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="stock-monitor", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _run(self):
+        while True:
+            db = SessionLocal()
+            try:
+                check_stock_alerts(db)
+            except Exception:
+                db.rollback()
+                logger.exception("stock alerts check failed")
+            finally:
+                db.close()
+            if self._stop.wait(self.interval):
+                return
+
+
+stock_monitor = StockMonitor(settings.STOCK_CHECK_INTERVAL_SEC)
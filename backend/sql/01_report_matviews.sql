@@ -0,0 +1,43 @@
+-- Витрины для тяжёлых отчётов.
+-- Снимки функций dishes_sales(), guest_statistics(), dishes_by_category()
+-- обновляются приложением через REFRESH MATERIALIZED VIEW CONCURRENTLY,
+-- для этого у каждой витрины есть уникальный индекс.
+-- Применять: psql "$DATABASE_URL" -f sql/01_report_matviews.sql
+
+CREATE TABLE IF NOT EXISTS report_refresh_log (
+    view_name    text PRIMARY KEY,
+    refreshed_at timestamptz NOT NULL
+);
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS mv_dishes_sales AS
+SELECT row_number() OVER (ORDER BY s.dish_name) AS row_id, s.*
+FROM dishes_sales() s;
+
+CREATE UNIQUE INDEX IF NOT EXISTS mv_dishes_sales_row_id_uq
+    ON mv_dishes_sales (row_id);
+
+-- Лимит применяется при чтении витрины
+CREATE MATERIALIZED VIEW IF NOT EXISTS mv_guest_statistics AS
+SELECT * FROM guest_statistics(2147483647);
+
+CREATE UNIQUE INDEX IF NOT EXISTS mv_guest_statistics_guest_id_uq
+    ON mv_guest_statistics (guest_id);
+
+CREATE INDEX IF NOT EXISTS mv_guest_statistics_revenue_idx
+    ON mv_guest_statistics (total_revenue DESC);
+
+-- Все категории сразу; фильтр по части названия — при чтении витрины
+CREATE MATERIALIZED VIEW IF NOT EXISTS mv_dishes_by_category AS
+SELECT DISTINCT ON (f.id) f.*
+FROM (SELECT DISTINCT category FROM dishes WHERE category IS NOT NULL) c
+CROSS JOIN LATERAL dishes_by_category(c.category) f
+ORDER BY f.id;
+
+CREATE UNIQUE INDEX IF NOT EXISTS mv_dishes_by_category_id_uq
+    ON mv_dishes_by_category (id);
+
+INSERT INTO report_refresh_log (view_name, refreshed_at)
+VALUES ('mv_dishes_sales', now()),
+       ('mv_guest_statistics', now()),
+       ('mv_dishes_by_category', now())
+ON CONFLICT (view_name) DO NOTHING;
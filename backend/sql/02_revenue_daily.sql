@@ -0,0 +1,71 @@
+-- Дневная свёртка выручки: сумма, число заказов и средний чек по дням.
+-- Поддерживается триггером на orders в той же транзакции, что и запись заказа.
+-- Применять: psql "$DATABASE_URL" -f sql/02_revenue_daily.sql
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS revenue_daily (
+    day          date PRIMARY KEY,
+    orders_count integer       NOT NULL DEFAULT 0,
+    revenue      numeric(14,2) NOT NULL DEFAULT 0
+);
+
+CREATE OR REPLACE FUNCTION revenue_daily_apply(p_day date, p_count integer, p_amount numeric)
+RETURNS void
+LANGUAGE sql
+AS $$
+    INSERT INTO revenue_daily (day, orders_count, revenue)
+    VALUES (p_day, p_count, p_amount)
+    ON CONFLICT (day) DO UPDATE
+    SET orders_count = revenue_daily.orders_count + EXCLUDED.orders_count,
+        revenue      = revenue_daily.revenue + EXCLUDED.revenue;
+$$;
+
+CREATE OR REPLACE FUNCTION revenue_daily_trg()
+RETURNS trigger
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') AND OLD.order_time IS NOT NULL THEN
+        PERFORM revenue_daily_apply(OLD.order_time::date, -1, -COALESCE(OLD.total_amount, 0));
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') AND NEW.order_time IS NOT NULL THEN
+        PERFORM revenue_daily_apply(NEW.order_time::date, 1, COALESCE(NEW.total_amount, 0));
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS orders_revenue_daily ON orders;
+CREATE TRIGGER orders_revenue_daily
+AFTER INSERT OR DELETE OR UPDATE OF order_time, total_amount ON orders
+FOR EACH ROW EXECUTE FUNCTION revenue_daily_trg();
+
+-- Начальное заполнение; блокировка не даёт потерять заказы, записанные параллельно
+LOCK TABLE orders IN SHARE MODE;
+TRUNCATE revenue_daily;
+INSERT INTO revenue_daily (day, orders_count, revenue)
+SELECT order_time::date, COUNT(*), COALESCE(SUM(total_amount), 0)
+FROM orders
+WHERE order_time IS NOT NULL
+GROUP BY order_time::date;
+
+COMMIT;
+
+-- Сверка свёртки с исходными данными: пустой результат — расхождений нет.
+-- SELECT * FROM revenue_daily_check('2024-01-01', '2024-12-31');
+CREATE OR REPLACE FUNCTION revenue_daily_check(p_from date, p_to date)
+RETURNS TABLE (source text, revenue numeric)
+LANGUAGE sql
+AS $$
+    WITH v AS (
+        SELECT 'get_revenue' AS source, get_revenue(p_from, p_to)::numeric AS revenue
+        UNION ALL
+        SELECT 'revenue_daily', COALESCE(SUM(r.revenue), 0)
+        FROM revenue_daily r
+        WHERE r.day BETWEEN p_from AND p_to
+    )
+    SELECT source, revenue
+    FROM v
+    WHERE (SELECT COUNT(DISTINCT revenue) FROM v) > 1;
+$$;
@@ -0,0 +1,27 @@
+-- Фоновые задачи отчётов: очередь и сохранённые результаты.
+-- Применять: psql "$DATABASE_URL" -f sql/03_report_jobs.sql
+
+CREATE TABLE IF NOT EXISTS report_jobs (
+    id          bigserial PRIMARY KEY,
+    kind        text        NOT NULL,
+    params      jsonb       NOT NULL DEFAULT '{}'::jsonb,
+    status      text        NOT NULL DEFAULT 'queued'
+                CHECK (status IN ('queued', 'running', 'done', 'failed')),
+    progress    smallint    NOT NULL DEFAULT 0,
+    rows        jsonb,
+    error       text,
+    created_by  integer,
+    created_at  timestamptz NOT NULL DEFAULT now(),
+    started_at  timestamptz,
+    finished_at timestamptz,
+    expires_at  timestamptz
+);
+
+CREATE INDEX IF NOT EXISTS report_jobs_queued_idx
+    ON report_jobs (id) WHERE status = 'queued';
+
+CREATE INDEX IF NOT EXISTS report_jobs_created_by_idx
+    ON report_jobs (created_by, id DESC);
+
+CREATE INDEX IF NOT EXISTS report_jobs_expires_at_idx
+    ON report_jobs (expires_at) WHERE expires_at IS NOT NULL;
@@ -0,0 +1,49 @@
+-- Уведомления об изменениях броней и столов для индекса свободных столов
+-- в приложении (app/availability.py).
+-- Ожидаемые колонки: bookings(table_id, booking_date, start_time, end_time),
+-- tables(id, table_number, seats, status).
+-- Применять: psql "$DATABASE_URL" -f sql/04_table_availability.sql
+
+CREATE OR REPLACE FUNCTION bookings_notify_trg()
+RETURNS trigger
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM pg_notify(
+            'bookings_changed',
+            json_build_object('table_id', OLD.table_id, 'date', OLD.booking_date)::text
+        );
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM pg_notify(
+            'bookings_changed',
+            json_build_object('table_id', NEW.table_id, 'date', NEW.booking_date)::text
+        );
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS bookings_notify ON bookings;
+CREATE TRIGGER bookings_notify
+AFTER INSERT OR UPDATE OR DELETE ON bookings
+FOR EACH ROW EXECUTE FUNCTION bookings_notify_trg();
+
+CREATE OR REPLACE FUNCTION tables_notify_trg()
+RETURNS trigger
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    PERFORM pg_notify('tables_changed', '');
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS tables_notify ON tables;
+CREATE TRIGGER tables_notify
+AFTER INSERT OR UPDATE OR DELETE ON tables
+FOR EACH STATEMENT EXECUTE FUNCTION tables_notify_trg();
+
+CREATE INDEX IF NOT EXISTS bookings_date_table_idx
+    ON bookings (booking_date, table_id);
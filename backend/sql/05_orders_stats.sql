@@ -0,0 +1,48 @@
+-- Счётчики для главной страницы: число заказов и общая сумма.
+-- Одна строка, обновляется триггером в транзакции записи заказа.
+-- Применять: psql "$DATABASE_URL" -f sql/05_orders_stats.sql
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS orders_stats (
+    id            boolean PRIMARY KEY DEFAULT true CHECK (id),
+    orders_count  bigint        NOT NULL DEFAULT 0,
+    total_revenue numeric(16,2) NOT NULL DEFAULT 0
+);
+
+CREATE OR REPLACE FUNCTION orders_stats_trg()
+RETURNS trigger
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        UPDATE orders_stats
+        SET orders_count = orders_count + 1,
+            total_revenue = total_revenue + COALESCE(NEW.total_amount, 0);
+    ELSIF TG_OP = 'DELETE' THEN
+        UPDATE orders_stats
+        SET orders_count = orders_count - 1,
+            total_revenue = total_revenue - COALESCE(OLD.total_amount, 0);
+    ELSIF NEW.total_amount IS DISTINCT FROM OLD.total_amount THEN
+        UPDATE orders_stats
+        SET total_revenue = total_revenue + COALESCE(NEW.total_amount, 0) - COALESCE(OLD.total_amount, 0);
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS orders_stats ON orders;
+CREATE TRIGGER orders_stats
+AFTER INSERT OR DELETE OR UPDATE OF total_amount ON orders
+FOR EACH ROW EXECUTE FUNCTION orders_stats_trg();
+
+-- Начальное заполнение
+LOCK TABLE orders IN SHARE MODE;
+INSERT INTO orders_stats (id, orders_count, total_revenue)
+SELECT true, COUNT(*), COALESCE(SUM(total_amount), 0)
+FROM orders
+ON CONFLICT (id) DO UPDATE
+SET orders_count = EXCLUDED.orders_count,
+    total_revenue = EXCLUDED.total_revenue;
+
+COMMIT;
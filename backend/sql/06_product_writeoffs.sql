@@ -0,0 +1,46 @@
+-- Пакетное списание продуктов по многим заказам.
+-- product_writeoffs отмечает заказы, по которым продукты уже списаны:
+-- повторный запуск (и одиночное списание) такие заказы пропускает.
+-- Рецептуры: dish_products(dish_id, product_id, quantity) — расход продукта на одну порцию.
+-- Применять: psql "$DATABASE_URL" -f sql/06_product_writeoffs.sql
+
+CREATE TABLE IF NOT EXISTS product_writeoffs (
+    order_id       integer PRIMARY KEY REFERENCES orders (id) ON DELETE CASCADE,
+    written_off_at timestamptz NOT NULL DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS orders_order_time_idx ON orders (order_time);
+
+-- Один оператор: отметить заказы, посчитать расход по всем сразу,
+-- обновить каждый продукт один раз.
+CREATE OR REPLACE FUNCTION consume_products_batch(p_order_ids integer[])
+RETURNS TABLE (product_id integer, product_name text, consumed numeric, remaining numeric, orders_count bigint)
+LANGUAGE sql
+AS $$
+    WITH claimed AS (
+        INSERT INTO product_writeoffs (order_id)
+        SELECT o.id
+        FROM orders o
+        WHERE o.id = ANY (p_order_ids)
+          AND o.status NOT IN ('отменён', 'cancelled')
+        ON CONFLICT (order_id) DO NOTHING
+        RETURNING order_id
+    ),
+    consumption AS (
+        SELECT dp.product_id, SUM(oi.quantity * dp.quantity) AS consumed
+        FROM claimed c
+        JOIN order_items oi ON oi.order_id = c.order_id
+        JOIN dish_products dp ON dp.dish_id = oi.dish_id
+        GROUP BY dp.product_id
+    ),
+    updated AS (
+        UPDATE products p
+        SET quantity = p.quantity - c.consumed
+        FROM consumption c
+        WHERE p.id = c.product_id
+        RETURNING p.id, p.name::text, c.consumed, p.quantity
+    )
+    SELECT u.id, u.name, u.consumed, u.quantity, (SELECT COUNT(*) FROM claimed)
+    FROM updated u
+    ORDER BY u.name;
+$$;
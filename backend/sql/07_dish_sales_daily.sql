@@ -0,0 +1,124 @@
+-- Продажи блюд по дням: количество и выручка по цене на момент заказа.
+-- Поддерживается триггерами на order_items и orders.
+-- Применять: psql "$DATABASE_URL" -f sql/07_dish_sales_daily.sql
+
+BEGIN;
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+-- Поиск по части названия/категории (ILIKE '%...%') — по триграммному индексу
+CREATE INDEX IF NOT EXISTS dishes_name_trgm_idx ON dishes USING gin (name gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS dishes_category_trgm_idx ON dishes USING gin (category gin_trgm_ops);
+
+CREATE TABLE IF NOT EXISTS dish_sales_daily (
+    dish_id  integer       NOT NULL REFERENCES dishes (id) ON DELETE CASCADE,
+    day      date          NOT NULL,
+    quantity numeric       NOT NULL DEFAULT 0,
+    revenue  numeric(14,2) NOT NULL DEFAULT 0,
+    lines    integer       NOT NULL DEFAULT 0,   -- позиций заказов = заказов с этим блюдом
+    PRIMARY KEY (dish_id, day)
+);
+
+-- Цена позиции фиксируется при записи: дальнейшие изменения dishes.price
+-- не переписывают историю продаж. Приложение цену не передаёт — её ставит триггер
+ALTER TABLE order_items ADD COLUMN IF NOT EXISTS price numeric(10,2);
+
+CREATE OR REPLACE FUNCTION order_items_price_trg()
+RETURNS trigger
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    IF NEW.price IS NULL
+       OR (TG_OP = 'UPDATE' AND NEW.dish_id <> OLD.dish_id AND NEW.price IS NOT DISTINCT FROM OLD.price) THEN
+        SELECT d.price INTO NEW.price FROM dishes d WHERE d.id = NEW.dish_id;
+    END IF;
+    RETURN NEW;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS order_items_price ON order_items;
+CREATE TRIGGER order_items_price
+BEFORE INSERT OR UPDATE OF dish_id, price ON order_items
+FOR EACH ROW EXECUTE FUNCTION order_items_price_trg();
+
+CREATE OR REPLACE FUNCTION dish_sales_apply(p_dish_id integer, p_day date, p_quantity numeric, p_revenue numeric, p_lines integer)
+RETURNS void
+LANGUAGE sql
+AS $$
+    INSERT INTO dish_sales_daily (dish_id, day, quantity, revenue, lines)
+    VALUES (p_dish_id, p_day, p_quantity, p_revenue, p_lines)
+    ON CONFLICT (dish_id, day) DO UPDATE
+    SET quantity = dish_sales_daily.quantity + EXCLUDED.quantity,
+        revenue  = dish_sales_daily.revenue + EXCLUDED.revenue,
+        lines    = dish_sales_daily.lines + EXCLUDED.lines;
+$$;
+
+CREATE OR REPLACE FUNCTION order_items_sales_trg()
+RETURNS trigger
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_day date;
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        -- при каскадном удалении заказа его вклад уже снят orders_sales_trg
+        SELECT o.order_time::date INTO v_day FROM orders o WHERE o.id = OLD.order_id;
+        IF v_day IS NOT NULL THEN
+            PERFORM dish_sales_apply(OLD.dish_id, v_day, -OLD.quantity, -(OLD.quantity * COALESCE(OLD.price, 0)), -1);
+        END IF;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        SELECT o.order_time::date INTO v_day FROM orders o WHERE o.id = NEW.order_id;
+        IF v_day IS NOT NULL THEN
+            PERFORM dish_sales_apply(NEW.dish_id, v_day, NEW.quantity, NEW.quantity * COALESCE(NEW.price, 0), 1);
+        END IF;
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS order_items_sales ON order_items;
+CREATE TRIGGER order_items_sales
+AFTER INSERT OR DELETE OR UPDATE OF order_id, dish_id, quantity, price ON order_items
+FOR EACH ROW EXECUTE FUNCTION order_items_sales_trg();
+
+-- Удаление заказа и перенос его даты: позиции ещё на месте (BEFORE)
+CREATE OR REPLACE FUNCTION orders_sales_trg()
+RETURNS trigger
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    IF OLD.order_time IS NOT NULL THEN
+        PERFORM dish_sales_apply(oi.dish_id, OLD.order_time::date, -oi.quantity, -(oi.quantity * COALESCE(oi.price, 0)), -1)
+        FROM order_items oi
+        WHERE oi.order_id = OLD.id;
+    END IF;
+    IF TG_OP = 'UPDATE' THEN
+        IF NEW.order_time IS NOT NULL THEN
+            PERFORM dish_sales_apply(oi.dish_id, NEW.order_time::date, oi.quantity, oi.quantity * COALESCE(oi.price, 0), 1)
+            FROM order_items oi
+            WHERE oi.order_id = NEW.id;
+        END IF;
+        RETURN NEW;
+    END IF;
+    RETURN OLD;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS orders_sales ON orders;
+CREATE TRIGGER orders_sales
+BEFORE DELETE OR UPDATE OF order_time ON orders
+FOR EACH ROW EXECUTE FUNCTION orders_sales_trg();
+
+-- Начальное заполнение
+LOCK TABLE orders, order_items IN SHARE MODE;
+UPDATE order_items oi SET price = d.price FROM dishes d WHERE d.id = oi.dish_id AND oi.price IS NULL;
+TRUNCATE dish_sales_daily;
+INSERT INTO dish_sales_daily (dish_id, day, quantity, revenue, lines)
+SELECT oi.dish_id, o.order_time::date, SUM(oi.quantity), SUM(oi.quantity * COALESCE(oi.price, 0)), COUNT(*)
+FROM order_items oi
+JOIN orders o ON o.id = oi.order_id
+WHERE o.order_time IS NOT NULL
+GROUP BY oi.dish_id, o.order_time::date;
+
+COMMIT;
@@ -0,0 +1,55 @@
+-- Почасовая свёртка заказов для тепловой карты нагрузки (день недели × час).
+-- Поддерживается триггером на orders, как revenue_daily.
+-- Применять: psql "$DATABASE_URL" -f sql/08_orders_hourly.sql
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS orders_hourly (
+    hour         timestamp PRIMARY KEY,          -- date_trunc('hour', order_time)
+    orders_count integer       NOT NULL DEFAULT 0,
+    revenue      numeric(14,2) NOT NULL DEFAULT 0
+);
+
+CREATE OR REPLACE FUNCTION orders_hourly_apply(p_hour timestamp, p_count integer, p_amount numeric)
+RETURNS void
+LANGUAGE sql
+AS $$
+    INSERT INTO orders_hourly (hour, orders_count, revenue)
+    VALUES (p_hour, p_count, p_amount)
+    ON CONFLICT (hour) DO UPDATE
+    SET orders_count = orders_hourly.orders_count + EXCLUDED.orders_count,
+        revenue      = orders_hourly.revenue + EXCLUDED.revenue;
+$$;
+
+CREATE OR REPLACE FUNCTION orders_hourly_trg()
+RETURNS trigger
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') AND OLD.order_time IS NOT NULL THEN
+        PERFORM orders_hourly_apply(date_trunc('hour', OLD.order_time), -1, -COALESCE(OLD.total_amount, 0));
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') AND NEW.order_time IS NOT NULL THEN
+        PERFORM orders_hourly_apply(date_trunc('hour', NEW.order_time), 1, COALESCE(NEW.total_amount, 0));
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS orders_hourly ON orders;
+CREATE TRIGGER orders_hourly
+AFTER INSERT OR DELETE OR UPDATE OF order_time, total_amount ON orders
+FOR EACH ROW EXECUTE FUNCTION orders_hourly_trg();
+
+-- Тепловая карта по блюду: позиции блюда -> заказы за период
+CREATE INDEX IF NOT EXISTS order_items_dish_order_idx ON order_items (dish_id, order_id);
+
+LOCK TABLE orders IN SHARE MODE;
+TRUNCATE orders_hourly;
+INSERT INTO orders_hourly (hour, orders_count, revenue)
+SELECT date_trunc('hour', order_time), COUNT(*), COALESCE(SUM(total_amount), 0)
+FROM orders
+WHERE order_time IS NOT NULL
+GROUP BY date_trunc('hour', order_time);
+
+COMMIT;
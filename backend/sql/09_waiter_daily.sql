@@ -0,0 +1,110 @@
+-- Показатели официантов по дням: заказы, выручка, время от заказа до оплаты.
+-- orders.paid_at ставится триггером при переходе заказа в статус «оплачен».
+-- Свёртка waiter_daily поддерживается триггером на orders, как revenue_daily.
+-- Применять: psql "$DATABASE_URL" -f sql/09_waiter_daily.sql
+
+BEGIN;
+
+ALTER TABLE orders ADD COLUMN IF NOT EXISTS paid_at timestamp;
+
+CREATE OR REPLACE FUNCTION orders_paid_at_trg()
+RETURNS trigger
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    IF NEW.status IN ('оплачен', 'paid') THEN
+        IF TG_OP = 'INSERT' OR OLD.status IS NULL OR OLD.status NOT IN ('оплачен', 'paid') THEN
+            NEW.paid_at := COALESCE(NEW.paid_at, now()::timestamp);
+        END IF;
+    ELSE
+        NEW.paid_at := NULL;
+    END IF;
+    RETURN NEW;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS orders_paid_at ON orders;
+CREATE TRIGGER orders_paid_at
+BEFORE INSERT OR UPDATE OF status ON orders
+FOR EACH ROW EXECUTE FUNCTION orders_paid_at_trg();
+
+CREATE TABLE IF NOT EXISTS waiter_daily (
+    waiter_id    integer       NOT NULL REFERENCES waiters (id) ON DELETE CASCADE,
+    day          date          NOT NULL,
+    orders_count integer       NOT NULL DEFAULT 0,
+    revenue      numeric(14,2) NOT NULL DEFAULT 0,
+    paid_count   integer       NOT NULL DEFAULT 0,   -- заказы с известным временем оплаты
+    paid_seconds numeric       NOT NULL DEFAULT 0,   -- суммарное время до оплаты
+    PRIMARY KEY (waiter_id, day)
+);
+
+CREATE OR REPLACE FUNCTION waiter_daily_apply(p_order orders, p_sign integer)
+RETURNS void
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_wait numeric;
+BEGIN
+    -- отменённые заказы в показатели официанта не входят
+    IF p_order.waiter_id IS NULL OR p_order.order_time IS NULL
+       OR COALESCE(p_order.status, '') IN ('отменён', 'cancelled') THEN
+        RETURN;
+    END IF;
+    v_wait := EXTRACT(EPOCH FROM p_order.paid_at - p_order.order_time);
+
+    INSERT INTO waiter_daily (waiter_id, day, orders_count, revenue, paid_count, paid_seconds)
+    VALUES (
+        p_order.waiter_id,
+        p_order.order_time::date,
+        p_sign,
+        p_sign * COALESCE(p_order.total_amount, 0),
+        CASE WHEN v_wait IS NULL THEN 0 ELSE p_sign END,
+        p_sign * COALESCE(v_wait, 0)
+    )
+    ON CONFLICT (waiter_id, day) DO UPDATE
+    SET orders_count = waiter_daily.orders_count + EXCLUDED.orders_count,
+        revenue      = waiter_daily.revenue + EXCLUDED.revenue,
+        paid_count   = waiter_daily.paid_count + EXCLUDED.paid_count,
+        paid_seconds = waiter_daily.paid_seconds + EXCLUDED.paid_seconds;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION waiter_daily_trg()
+RETURNS trigger
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM waiter_daily_apply(OLD, -1);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM waiter_daily_apply(NEW, 1);
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS orders_waiter_daily ON orders;
+CREATE TRIGGER orders_waiter_daily
+AFTER INSERT OR DELETE OR UPDATE OF waiter_id, order_time, total_amount, status, paid_at ON orders
+FOR EACH ROW EXECUTE FUNCTION waiter_daily_trg();
+
+-- Начальное заполнение. Время оплаты уже оплаченных заказов неизвестно:
+-- среднее время до оплаты считается по заказам, оплаченным после установки.
+LOCK TABLE orders IN SHARE MODE;
+TRUNCATE waiter_daily;
+INSERT INTO waiter_daily (waiter_id, day, orders_count, revenue, paid_count, paid_seconds)
+SELECT
+    waiter_id,
+    order_time::date,
+    COUNT(*),
+    COALESCE(SUM(total_amount), 0),
+    COUNT(paid_at),
+    COALESCE(SUM(EXTRACT(EPOCH FROM paid_at - order_time)), 0)
+FROM orders
+WHERE waiter_id IS NOT NULL
+  AND order_time IS NOT NULL
+  AND COALESCE(status, '') NOT IN ('отменён', 'cancelled')
+GROUP BY waiter_id, order_time::date;
+
+COMMIT;
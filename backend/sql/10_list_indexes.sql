@@ -0,0 +1,35 @@
+-- Индексы для постраничного вывода справочников (app/listing.py):
+-- keyset по (колонка сортировки, id) — по индексу на каждую сортируемую колонку.
+-- CONCURRENTLY: можно применять на работающей базе, вне транзакции.
+-- Применять: psql "$DATABASE_URL" -f sql/10_list_indexes.sql
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS guests_last_name_id_idx   ON guests (last_name, id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS guests_first_name_id_idx  ON guests (first_name, id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS guests_middle_name_id_idx ON guests (middle_name, id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS guests_birth_date_id_idx  ON guests (birth_date, id);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS tables_table_number_id_idx ON tables (table_number, id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS tables_seats_id_idx        ON tables (seats, id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS tables_status_id_idx       ON tables (status, id);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS dishes_name_id_idx              ON dishes (name, id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS dishes_category_id_idx          ON dishes (category, id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS dishes_price_id_idx             ON dishes (price, id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS dishes_country_of_origin_id_idx ON dishes (country_of_origin, id);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS waiters_last_name_id_idx   ON waiters (last_name, id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS waiters_first_name_id_idx  ON waiters (first_name, id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS waiters_middle_name_id_idx ON waiters (middle_name, id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS waiters_salary_id_idx      ON waiters (salary, id);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS suppliers_name_id_idx           ON suppliers (name, id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS suppliers_address_id_idx        ON suppliers (address, id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS suppliers_contact_person_id_idx ON suppliers (contact_person, id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS suppliers_phone_id_idx          ON suppliers (phone, id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS suppliers_email_id_idx          ON suppliers (email, id);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS products_name_id_idx        ON products (name, id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS products_weight_id_idx      ON products (weight, id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS products_expiry_date_id_idx ON products (expiry_date, id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS products_quantity_id_idx    ON products (quantity, id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS products_category_id_idx    ON products (category, id);
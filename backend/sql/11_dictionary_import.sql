@@ -0,0 +1,23 @@
+-- Загрузка справочников из CSV (app/importer.py).
+-- Применять: psql "$DATABASE_URL" -f sql/11_dictionary_import.sql
+
+-- Проверка даты (ГГГГ-ММ-ДД, как в выгрузке) без исключения для всего запроса. Вызывается только для
+-- значений, похожих на дату, поэтому подтранзакция нужна редко.
+CREATE OR REPLACE FUNCTION import_valid_date(p_value text)
+RETURNS boolean
+LANGUAGE plpgsql
+IMMUTABLE
+AS $$
+BEGIN
+    IF p_value IS NULL THEN
+        RETURN true;
+    END IF;
+    IF p_value !~ '^\d{4}-\d{1,2}-\d{1,2}$' THEN
+        RETURN false;
+    END IF;
+    PERFORM p_value::date;
+    RETURN true;
+EXCEPTION WHEN others THEN
+    RETURN false;
+END;
+$$;
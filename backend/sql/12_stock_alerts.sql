@@ -0,0 +1,102 @@
+-- Монитор склада: продукты ниже порога дозаказа и с истекающим сроком годности.
+-- stock_alerts хранит только такие продукты и поддерживается триггером на products
+-- (правка в справочнике, загрузка CSV, списание consume_products / consume_products_batch).
+-- «Истекающий» зависит от текущей даты, поэтому граница checked_until сдвигается
+-- фоновой проверкой stock_alerts_check() (app/stock.py): она добирает только продукты,
+-- чей срок попал в новый диапазон дат, по индексу products (expiry_date, id).
+-- Применять: psql "$DATABASE_URL" -f sql/12_stock_alerts.sql
+
+BEGIN;
+
+ALTER TABLE products ADD COLUMN IF NOT EXISTS reorder_level numeric;
+
+CREATE INDEX IF NOT EXISTS products_expiry_date_id_idx ON products (expiry_date, id);
+CREATE INDEX IF NOT EXISTS products_low_stock_idx ON products (id) WHERE quantity <= reorder_level;
+CREATE INDEX IF NOT EXISTS products_reorder_level_id_idx ON products (reorder_level, id);
+
+-- Одна строка: продукты со сроком до checked_until включительно уже в stock_alerts
+CREATE TABLE IF NOT EXISTS stock_alert_state (
+    id            boolean PRIMARY KEY DEFAULT true CHECK (id),
+    checked_until date    NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS stock_alerts (
+    product_id integer     PRIMARY KEY REFERENCES products (id) ON DELETE CASCADE,
+    low_stock  boolean     NOT NULL,
+    updated_at timestamptz NOT NULL DEFAULT now()
+);
+
+CREATE OR REPLACE FUNCTION stock_alerts_trg()
+RETURNS trigger
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_low boolean := COALESCE(NEW.quantity <= NEW.reorder_level, false);
+BEGIN
+    IF v_low OR NEW.expiry_date <= (SELECT checked_until FROM stock_alert_state) THEN
+        INSERT INTO stock_alerts (product_id, low_stock)
+        VALUES (NEW.id, v_low)
+        ON CONFLICT (product_id) DO UPDATE
+        SET low_stock = EXCLUDED.low_stock, updated_at = now()
+        WHERE stock_alerts.low_stock IS DISTINCT FROM EXCLUDED.low_stock;
+    ELSIF TG_OP = 'UPDATE' THEN
+        DELETE FROM stock_alerts WHERE product_id = NEW.id;
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS products_stock_alerts ON products;
+CREATE TRIGGER products_stock_alerts
+AFTER INSERT OR UPDATE OF quantity, reorder_level, expiry_date ON products
+FOR EACH ROW EXECUTE FUNCTION stock_alerts_trg();
+
+-- Сдвиг границы сроков до current_date + p_horizon; возвращает число изменённых строк.
+-- Обычно добирает продукты со сроком в (старая граница, новая граница];
+-- если горизонт уменьшили — убирает лишние.
+CREATE OR REPLACE FUNCTION stock_alerts_check(p_horizon integer)
+RETURNS integer
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_old date;
+    v_new date := current_date + p_horizon;
+    v_changed integer;
+BEGIN
+    SELECT checked_until INTO v_old FROM stock_alert_state FOR UPDATE;
+    IF v_old = v_new THEN
+        RETURN 0;
+    END IF;
+
+    IF v_old > v_new THEN
+        DELETE FROM stock_alerts a
+        USING products p
+        WHERE p.id = a.product_id AND NOT a.low_stock AND p.expiry_date > v_new;
+    ELSE
+        INSERT INTO stock_alerts (product_id, low_stock)
+        SELECT p.id, false
+        FROM products p
+        WHERE p.expiry_date > v_old AND p.expiry_date <= v_new
+        ON CONFLICT (product_id) DO NOTHING;
+    END IF;
+    GET DIAGNOSTICS v_changed = ROW_COUNT;
+
+    UPDATE stock_alert_state SET checked_until = v_new;
+    RETURN v_changed;
+END;
+$$;
+
+-- Начальное заполнение (горизонт 30 дней, дальше его задаёт приложение)
+LOCK TABLE products IN SHARE ROW EXCLUSIVE MODE;
+
+INSERT INTO stock_alert_state (checked_until) VALUES (current_date + 30)
+ON CONFLICT (id) DO NOTHING;
+
+TRUNCATE stock_alerts;
+INSERT INTO stock_alerts (product_id, low_stock)
+SELECT p.id, COALESCE(p.quantity <= p.reorder_level, false)
+FROM products p
+WHERE p.quantity <= p.reorder_level
+   OR p.expiry_date <= (SELECT checked_until FROM stock_alert_state);
+
+COMMIT;
@@ -0,0 +1,133 @@
+-- Один гость — один человек.
+-- Гость ищется по нормализованному ФИО (регистр, лишние пробелы, ё/е)
+-- и дате рождения; новый создаётся, только если такого нет (find_or_create_guest).
+-- merge_duplicate_guests() объединяет уже накопившиеся дубликаты:
+-- ссылки на гостя переводятся на запись с наименьшим id, дубликаты удаляются.
+-- Применять: psql "$DATABASE_URL" -f sql/13_guest_dedup.sql
+
+BEGIN;
+
+CREATE OR REPLACE FUNCTION guest_name_key(p_last text, p_first text, p_middle text)
+RETURNS text
+LANGUAGE sql
+IMMUTABLE
+AS $$
+    SELECT btrim(regexp_replace(
+        translate(lower(COALESCE(p_last, '') || ' ' || COALESCE(p_first, '') || ' ' || COALESCE(p_middle, '')), 'ё', 'е'),
+        '\s+', ' ', 'g'
+    ));
+$$;
+
+CREATE INDEX IF NOT EXISTS guests_name_key_idx
+    ON guests (guest_name_key(last_name, first_name, middle_name), birth_date);
+
+CREATE OR REPLACE FUNCTION find_or_create_guest(p_last text, p_first text, p_middle text, p_birth date)
+RETURNS integer
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_key text := guest_name_key(p_last, p_first, p_middle);
+    v_id integer;
+BEGIN
+    -- два одновременных заказа одного гостя не должны создать две записи
+    PERFORM pg_advisory_xact_lock(hashtext('guest:' || v_key || ':' || COALESCE(p_birth::text, '')));
+
+    IF p_birth IS NULL THEN
+        SELECT id INTO v_id FROM guests
+        WHERE guest_name_key(last_name, first_name, middle_name) = v_key AND birth_date IS NULL
+        ORDER BY id LIMIT 1;
+    ELSE
+        SELECT id INTO v_id FROM guests
+        WHERE guest_name_key(last_name, first_name, middle_name) = v_key AND birth_date = p_birth
+        ORDER BY id LIMIT 1;
+    END IF;
+
+    IF v_id IS NULL THEN
+        INSERT INTO guests (last_name, first_name, middle_name, birth_date, total_orders, total_discount)
+        VALUES (btrim(p_last), btrim(p_first), NULLIF(btrim(p_middle), ''), p_birth, 0, 0)
+        RETURNING id INTO v_id;
+    END IF;
+    RETURN v_id;
+END;
+$$;
+
+-- Колонки, ссылающиеся на guests: внешние ключи плюс orders/users.guest_id
+CREATE OR REPLACE FUNCTION guest_references()
+RETURNS TABLE (table_name regclass, column_name name)
+LANGUAGE sql
+STABLE
+AS $$
+    SELECT c.conrelid::regclass, a.attname
+    FROM pg_constraint c
+    JOIN pg_attribute a ON a.attrelid = c.conrelid AND a.attnum = c.conkey[1]
+    WHERE c.contype = 'f' AND c.confrelid = 'guests'::regclass AND cardinality(c.conkey) = 1
+    UNION
+    SELECT cl.oid::regclass, a.attname
+    FROM pg_class cl
+    JOIN pg_attribute a ON a.attrelid = cl.oid AND a.attname = 'guest_id' AND NOT a.attisdropped
+    WHERE cl.oid IN ('orders'::regclass, 'users'::regclass);
+$$;
+
+CREATE OR REPLACE FUNCTION merge_duplicate_guests()
+RETURNS TABLE (merged_guests bigint, moved_orders bigint)
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    r record;
+    v_rows bigint;
+BEGIN
+    merged_guests := 0;
+    moved_orders := 0;
+
+    -- новые гости (find_or_create_guest) ждут окончания объединения
+    LOCK TABLE guests IN SHARE ROW EXCLUSIVE MODE;
+
+    DROP TABLE IF EXISTS guest_merge;
+    CREATE TEMP TABLE guest_merge ON COMMIT DROP AS
+    SELECT id AS dup_id, keep_id
+    FROM (
+        SELECT id, MIN(id) OVER (
+            PARTITION BY guest_name_key(last_name, first_name, middle_name), birth_date
+        ) AS keep_id
+        FROM guests
+    ) g
+    WHERE id <> keep_id;
+
+    IF NOT EXISTS (SELECT 1 FROM guest_merge) THEN
+        RETURN NEXT;
+        RETURN;
+    END IF;
+    CREATE UNIQUE INDEX ON guest_merge (dup_id);
+    ANALYZE guest_merge;
+
+    FOR r IN SELECT * FROM guest_references() LOOP
+        EXECUTE format(
+            'UPDATE %s t SET %I = m.keep_id FROM guest_merge m WHERE t.%I = m.dup_id',
+            r.table_name, r.column_name, r.column_name
+        );
+        GET DIAGNOSTICS v_rows = ROW_COUNT;
+        IF r.table_name = 'orders'::regclass THEN
+            moved_orders := moved_orders + v_rows;
+        END IF;
+    END LOOP;
+
+    UPDATE guests g
+    SET total_orders = COALESCE(g.total_orders, 0) + d.total_orders,
+        total_discount = COALESCE(g.total_discount, 0) + d.total_discount
+    FROM (
+        SELECT m.keep_id,
+               SUM(COALESCE(dup.total_orders, 0)) AS total_orders,
+               SUM(COALESCE(dup.total_discount, 0)) AS total_discount
+        FROM guest_merge m
+        JOIN guests dup ON dup.id = m.dup_id
+        GROUP BY m.keep_id
+    ) d
+    WHERE g.id = d.keep_id;
+
+    DELETE FROM guests g USING guest_merge m WHERE g.id = m.dup_id;
+    GET DIAGNOSTICS merged_guests = ROW_COUNT;
+    RETURN NEXT;
+END;
+$$;
+
+COMMIT;
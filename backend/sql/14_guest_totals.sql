@@ -0,0 +1,148 @@
+-- Итоги по гостю: число заказов, сумма и последний визит.
+-- guests.total_orders / total_spent / last_visit поддерживаются триггером на orders
+-- в той же транзакции, что и запись заказа; отменённые заказы не учитываются.
+-- Профиль и статистика гостей читают их напрямую, без агрегации orders.
+-- Витрина mv_guest_statistics больше не нужна.
+-- Применять: psql "$DATABASE_URL" -f sql/14_guest_totals.sql
+
+BEGIN;
+
+ALTER TABLE guests ADD COLUMN IF NOT EXISTS total_spent numeric(14,2) NOT NULL DEFAULT 0;
+ALTER TABLE guests ADD COLUMN IF NOT EXISTS last_visit timestamp;
+
+-- последний визит пересчитывается по индексу, если удалён или перенесён самый поздний заказ
+CREATE INDEX IF NOT EXISTS orders_guest_time_idx ON orders (guest_id, order_time DESC);
+
+CREATE INDEX IF NOT EXISTS guests_total_spent_idx
+    ON guests (total_spent DESC, id) WHERE total_orders > 0;
+
+CREATE OR REPLACE FUNCTION guest_totals_apply(p_order orders, p_sign integer)
+RETURNS void
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    IF p_order.guest_id IS NULL OR COALESCE(p_order.status, '') IN ('отменён', 'cancelled') THEN
+        RETURN;
+    END IF;
+
+    UPDATE guests g
+    SET total_orders = COALESCE(g.total_orders, 0) + p_sign,
+        total_spent  = g.total_spent + p_sign * COALESCE(p_order.total_amount, 0),
+        last_visit   = CASE
+            WHEN p_sign > 0 THEN GREATEST(g.last_visit, p_order.order_time)
+            WHEN g.last_visit > p_order.order_time THEN g.last_visit
+            ELSE (
+                SELECT MAX(o.order_time)
+                FROM orders o
+                WHERE o.guest_id = p_order.guest_id
+                  AND COALESCE(o.status, '') NOT IN ('отменён', 'cancelled')
+            )
+        END
+    WHERE g.id = p_order.guest_id;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION guest_totals_trg()
+RETURNS trigger
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM guest_totals_apply(OLD, -1);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM guest_totals_apply(NEW, 1);
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS orders_guest_totals ON orders;
+CREATE TRIGGER orders_guest_totals
+AFTER INSERT OR DELETE OR UPDATE OF guest_id, total_amount, status, order_time ON orders
+FOR EACH ROW EXECUTE FUNCTION guest_totals_trg();
+
+-- Начальное заполнение
+LOCK TABLE orders IN SHARE ROW EXCLUSIVE MODE;
+
+UPDATE guests g
+SET total_orders = COALESCE(s.orders_count, 0),
+    total_spent  = COALESCE(s.spent, 0),
+    last_visit   = s.last_visit
+FROM guests g2
+LEFT JOIN (
+    SELECT guest_id, COUNT(*) AS orders_count, SUM(COALESCE(total_amount, 0)) AS spent, MAX(order_time) AS last_visit
+    FROM orders
+    WHERE guest_id IS NOT NULL AND COALESCE(status, '') NOT IN ('отменён', 'cancelled')
+    GROUP BY guest_id
+) s ON s.guest_id = g2.id
+WHERE g.id = g2.id;
+
+-- Объединение дубликатов (sql/13_guest_dedup.sql): число заказов теперь переносит
+-- триггер вместе с заказами, поэтому функция больше не складывает total_orders
+CREATE OR REPLACE FUNCTION merge_duplicate_guests()
+RETURNS TABLE (merged_guests bigint, moved_orders bigint)
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    r record;
+    v_rows bigint;
+BEGIN
+    merged_guests := 0;
+    moved_orders := 0;
+
+    -- новые гости (find_or_create_guest) ждут окончания объединения
+    LOCK TABLE guests IN SHARE ROW EXCLUSIVE MODE;
+
+    DROP TABLE IF EXISTS guest_merge;
+    CREATE TEMP TABLE guest_merge ON COMMIT DROP AS
+    SELECT id AS dup_id, keep_id
+    FROM (
+        SELECT id, MIN(id) OVER (
+            PARTITION BY guest_name_key(last_name, first_name, middle_name), birth_date
+        ) AS keep_id
+        FROM guests
+    ) g
+    WHERE id <> keep_id;
+
+    IF NOT EXISTS (SELECT 1 FROM guest_merge) THEN
+        RETURN NEXT;
+        RETURN;
+    END IF;
+    CREATE UNIQUE INDEX ON guest_merge (dup_id);
+    ANALYZE guest_merge;
+
+    FOR r IN SELECT * FROM guest_references() LOOP
+        EXECUTE format(
+            'UPDATE %s t SET %I = m.keep_id FROM guest_merge m WHERE t.%I = m.dup_id',
+            r.table_name, r.column_name, r.column_name
+        );
+        GET DIAGNOSTICS v_rows = ROW_COUNT;
+        IF r.table_name = 'orders'::regclass THEN
+            moved_orders := moved_orders + v_rows;
+        END IF;
+    END LOOP;
+
+    -- число заказов и сумму переносит триггер orders_guest_totals
+    -- вместе с самими заказами; скидки складываем здесь
+    UPDATE guests g
+    SET total_discount = COALESCE(g.total_discount, 0) + d.total_discount
+    FROM (
+        SELECT m.keep_id,
+               SUM(COALESCE(dup.total_discount, 0)) AS total_discount
+        FROM guest_merge m
+        JOIN guests dup ON dup.id = m.dup_id
+        GROUP BY m.keep_id
+    ) d
+    WHERE g.id = d.keep_id;
+
+    DELETE FROM guests g USING guest_merge m WHERE g.id = m.dup_id;
+    GET DIAGNOSTICS merged_guests = ROW_COUNT;
+    RETURN NEXT;
+END;
+$$;
+
+DROP MATERIALIZED VIEW IF EXISTS mv_guest_statistics;
+DELETE FROM report_refresh_log WHERE view_name = 'mv_guest_statistics';
+
+COMMIT;
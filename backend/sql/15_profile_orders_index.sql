@@ -0,0 +1,13 @@
+-- Последние заказы гостя на странице профиля: top-N по индексу (guest_id, order_time DESC),
+-- остальные колонки списка — в INCLUDE, поэтому чтение идёт только по индексу.
+-- Заменяет orders_guest_time_idx из sql/14_guest_totals.sql: ключ тот же, он же
+-- подходит и для пересчёта последнего визита.
+-- CONCURRENTLY: можно применять на работающей базе, вне транзакции.
+-- Применять: psql "$DATABASE_URL" -f sql/15_profile_orders_index.sql
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS orders_guest_recent_idx
+    ON orders (guest_id, order_time DESC) INCLUDE (id, total_amount, status);
+
+DROP INDEX CONCURRENTLY IF EXISTS orders_guest_time_idx;
+
+VACUUM (ANALYZE) orders;
@@ -0,0 +1,21 @@
+-- Уведомления об изменениях заказов для живого списка /заказы (app/order_feed.py).
+-- Payload: {"id": ..., "op": "INSERT" | "UPDATE" | "DELETE"}; NOTIFY доставляется при COMMIT.
+-- Применять: psql "$DATABASE_URL" -f sql/16_orders_notify.sql
+
+CREATE OR REPLACE FUNCTION orders_notify_trg()
+RETURNS trigger
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    PERFORM pg_notify(
+        'orders_changed',
+        json_build_object('id', CASE WHEN TG_OP = 'DELETE' THEN OLD.id ELSE NEW.id END, 'op', TG_OP)::text
+    );
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS orders_notify ON orders;
+CREATE TRIGGER orders_notify
+AFTER INSERT OR DELETE OR UPDATE OF status, total_amount, guest_id, table_id, waiter_id, order_time ON orders
+FOR EACH ROW EXECUTE FUNCTION orders_notify_trg();
@@ -0,0 +1,16 @@
+-- Фоновые задачи: владелец и отметка жизни.
+-- worker — процесс (хост:pid), выполняющий задачу; он раз в JOB_HEARTBEAT_SEC
+-- обновляет heartbeat_at у своих задач. Задача без отметки дольше JOB_STALE_SEC
+-- переводится в ошибку любым воркером (app/jobs.py, JobSweeper).
+-- Колонка progress больше не заполняется.
+-- Применять: psql "$DATABASE_URL" -f sql/17_report_jobs_heartbeat.sql
+
+BEGIN;
+
+ALTER TABLE report_jobs ADD COLUMN IF NOT EXISTS worker text;
+ALTER TABLE report_jobs ADD COLUMN IF NOT EXISTS heartbeat_at timestamptz;
+
+CREATE INDEX IF NOT EXISTS report_jobs_running_idx
+    ON report_jobs (heartbeat_at) WHERE status = 'running';
+
+COMMIT;
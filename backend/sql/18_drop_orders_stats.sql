@@ -0,0 +1,12 @@
+-- Счётчики главной страницы считаются по дневной свёртке revenue_daily
+-- (sql/02_revenue_daily.sql). Одна строка orders_stats, обновляемая триггером,
+-- сериализовала все параллельные записи заказов на своей блокировке.
+-- Применять: psql "$DATABASE_URL" -f sql/18_drop_orders_stats.sql
+
+BEGIN;
+
+DROP TRIGGER IF EXISTS orders_stats ON orders;
+DROP FUNCTION IF EXISTS orders_stats_trg();
+DROP TABLE IF EXISTS orders_stats;
+
+COMMIT;
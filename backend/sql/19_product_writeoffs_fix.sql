@@ -0,0 +1,68 @@
+-- Пакетное списание (sql/06_product_writeoffs.sql): прежние списания и нехватка.
+-- 1. До 06 заказы списывались по одному без отметки в product_writeoffs, и первый
+--    пакет по периоду списал бы их повторно. Отмечаем как списанные все заказы
+--    раньше первой записанной отметки (если отметок нет — раньше текущего дня:
+--    по прежнему порядку заказы списывались в конце каждого дня).
+-- 2. Остаток не уходит в минус: списывается не больше, чем есть,
+--    недостающее возвращается в колонке shortage.
+-- Применять: psql "$DATABASE_URL" -f sql/19_product_writeoffs_fix.sql
+
+BEGIN;
+
+LOCK TABLE product_writeoffs IN SHARE ROW EXCLUSIVE MODE;
+
+INSERT INTO product_writeoffs (order_id)
+SELECT o.id
+FROM orders o
+WHERE o.order_time < COALESCE((SELECT MIN(written_off_at) FROM product_writeoffs), current_date)
+  AND COALESCE(o.status, '') NOT IN ('отменён', 'cancelled')
+ON CONFLICT (order_id) DO NOTHING;
+
+-- Меняется набор колонок результата — CREATE OR REPLACE не подходит
+DROP FUNCTION IF EXISTS consume_products_batch(integer[]);
+
+CREATE FUNCTION consume_products_batch(p_order_ids integer[])
+RETURNS TABLE (product_id integer, product_name text, consumed numeric, remaining numeric,
+               shortage numeric, orders_count bigint)
+LANGUAGE sql
+AS $$
+    WITH claimed AS (
+        INSERT INTO product_writeoffs (order_id)
+        SELECT o.id
+        FROM orders o
+        WHERE o.id = ANY (p_order_ids)
+          AND o.status NOT IN ('отменён', 'cancelled')
+        ON CONFLICT (order_id) DO NOTHING
+        RETURNING order_id
+    ),
+    consumption AS (
+        SELECT dp.product_id, SUM(oi.quantity * dp.quantity) AS consumed
+        FROM claimed c
+        JOIN order_items oi ON oi.order_id = c.order_id
+        JOIN dish_products dp ON dp.dish_id = oi.dish_id
+        GROUP BY dp.product_id
+    ),
+    -- Остаток до списания; FOR UPDATE — последняя версия строки, её же увидит UPDATE
+    stock AS (
+        SELECT p.id, GREATEST(COALESCE(p.quantity, 0), 0) AS quantity
+        FROM products p
+        JOIN consumption c ON c.product_id = p.id
+        FOR UPDATE OF p
+    ),
+    updated AS (
+        UPDATE products p
+        SET quantity = GREATEST(s.quantity - c.consumed, 0)
+        FROM consumption c
+        JOIN stock s ON s.id = c.product_id
+        WHERE p.id = c.product_id
+        RETURNING p.id, p.name::text,
+                  LEAST(c.consumed, s.quantity) AS consumed,
+                  p.quantity,
+                  GREATEST(c.consumed - s.quantity, 0) AS shortage
+    )
+    SELECT u.id, u.name, u.consumed, u.quantity, u.shortage, (SELECT COUNT(*) FROM claimed)
+    FROM updated u
+    ORDER BY u.name;
+$$;
+
+COMMIT;
@@ -0,0 +1,104 @@
+-- Поиск и объединение гостей (sql/13_guest_dedup.sql) — только когда совпадение надёжно.
+-- Дата рождения необязательна и раньше не собиралась, поэтому без неё одно ФИО —
+-- ещё не один человек: гость без даты рождения всегда создаётся заново и не объединяется.
+-- Гость, привязанный к аккаунту (users.guest_id), не подбирается для новых заказов
+-- и не участвует в объединении: иначе чужие заказы появились бы в профиле пользователя.
+-- Применять: psql "$DATABASE_URL" -f sql/20_guest_dedup_linked.sql
+
+BEGIN;
+
+CREATE INDEX IF NOT EXISTS users_guest_id_idx ON users (guest_id);
+
+CREATE OR REPLACE FUNCTION find_or_create_guest(p_last text, p_first text, p_middle text, p_birth date)
+RETURNS integer
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_key text := guest_name_key(p_last, p_first, p_middle);
+    v_id integer;
+BEGIN
+    IF p_birth IS NOT NULL THEN
+        -- два одновременных заказа одного гостя не должны создать две записи
+        PERFORM pg_advisory_xact_lock(hashtext('guest:' || v_key || ':' || p_birth::text));
+
+        SELECT g.id INTO v_id FROM guests g
+        WHERE guest_name_key(g.last_name, g.first_name, g.middle_name) = v_key
+          AND g.birth_date = p_birth
+          AND NOT EXISTS (SELECT 1 FROM users u WHERE u.guest_id = g.id)
+        ORDER BY g.id LIMIT 1;
+    END IF;
+
+    IF v_id IS NULL THEN
+        INSERT INTO guests (last_name, first_name, middle_name, birth_date, total_orders, total_discount)
+        VALUES (btrim(p_last), btrim(p_first), NULLIF(btrim(p_middle), ''), p_birth, 0, 0)
+        RETURNING id INTO v_id;
+    END IF;
+    RETURN v_id;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION merge_duplicate_guests()
+RETURNS TABLE (merged_guests bigint, moved_orders bigint)
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    r record;
+    v_rows bigint;
+BEGIN
+    merged_guests := 0;
+    moved_orders := 0;
+
+    -- новые гости (find_or_create_guest) и привязка аккаунтов ждут окончания объединения
+    LOCK TABLE guests, users IN SHARE ROW EXCLUSIVE MODE;
+
+    DROP TABLE IF EXISTS guest_merge;
+    CREATE TEMP TABLE guest_merge ON COMMIT DROP AS
+    SELECT id AS dup_id, keep_id
+    FROM (
+        SELECT g.id, MIN(g.id) OVER (
+            PARTITION BY guest_name_key(g.last_name, g.first_name, g.middle_name), g.birth_date
+        ) AS keep_id
+        FROM guests g
+        WHERE g.birth_date IS NOT NULL
+          AND NOT EXISTS (SELECT 1 FROM users u WHERE u.guest_id = g.id)
+    ) g
+    WHERE id <> keep_id;
+
+    IF NOT EXISTS (SELECT 1 FROM guest_merge) THEN
+        RETURN NEXT;
+        RETURN;
+    END IF;
+    CREATE UNIQUE INDEX ON guest_merge (dup_id);
+    ANALYZE guest_merge;
+
+    FOR r IN SELECT * FROM guest_references() LOOP
+        EXECUTE format(
+            'UPDATE %s t SET %I = m.keep_id FROM guest_merge m WHERE t.%I = m.dup_id',
+            r.table_name, r.column_name, r.column_name
+        );
+        GET DIAGNOSTICS v_rows = ROW_COUNT;
+        IF r.table_name = 'orders'::regclass THEN
+            moved_orders := moved_orders + v_rows;
+        END IF;
+    END LOOP;
+
+    -- число заказов и сумму переносит триггер orders_guest_totals (sql/14_guest_totals.sql)
+    -- вместе с самими заказами; скидки складываем здесь
+    UPDATE guests g
+    SET total_discount = COALESCE(g.total_discount, 0) + d.total_discount
+    FROM (
+        SELECT m.keep_id,
+               SUM(COALESCE(dup.total_discount, 0)) AS total_discount
+        FROM guest_merge m
+        JOIN guests dup ON dup.id = m.dup_id
+        GROUP BY m.keep_id
+    ) d
+    WHERE g.id = d.keep_id;
+
+    DELETE FROM guests g USING guest_merge m WHERE g.id = m.dup_id;
+    GET DIAGNOSTICS merged_guests = ROW_COUNT;
+    RETURN NEXT;
+END;
+$$;
+
+COMMIT;